@@ -1,6 +1,7 @@
 from cart.models import Order
 from cart.models import OrderItem
 from cart.models import ProductInCart
+from cart.services import _invalidate_cart_on_commit
 from django.contrib import admin
 
 
@@ -14,6 +15,20 @@ class ProductInCartAdmin(admin.ModelAdmin):
     )
     list_per_page = 20
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        _invalidate_cart_on_commit(obj.user_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        _invalidate_cart_on_commit(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list("user_id", flat=True))
+        super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            _invalidate_cart_on_commit(user_id)
+
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -0,0 +1,101 @@
+from time import perf_counter
+from typing import Callable
+
+from cart.models import ProductInCart
+from cart.services import _bump_cart_version
+from cart.services import _get_available_sizes
+from commerce.factories import create_synthetic_catalog
+from commerce.models import Product
+from commerce.models import SizeAndNumber
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db import transaction
+from django.test.utils import CaptureQueriesContext
+
+
+def _get_available_sizes_per_size(user_id: int, product_id: int) -> list[str]:
+    product = Product.in_stock.get(pk=product_id)
+
+    sizes = []
+    for item in product.size_and_number_set.all():
+        if item.number > 0:
+            try:
+                ProductInCart.objects.get(
+                    product_id=product_id, user_id=user_id, size=item.size
+                )
+            except ProductInCart.DoesNotExist:
+                sizes.append(item.size)
+    return sizes
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает поиск доступных размеров запросом на каждый размер "
+        "и одним anti-join"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument("--sizes", nargs="+", type=int, default=[5, 50, 200])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            product_ids = create_synthetic_catalog(options["products"])
+            user = get_user_model().objects.create(email="benchmark-sizes@example.com")
+            for number_of_sizes, product_id in zip(options["sizes"], product_ids):
+                SizeAndNumber.objects.filter(product_id=product_id).delete()
+                SizeAndNumber.objects.bulk_create(
+                    [
+                        SizeAndNumber(product_id=product_id, size=str(size), number=1)
+                        for size in range(number_of_sizes)
+                    ]
+                )
+                Product.objects.filter(pk=product_id).update(
+                    total_number=number_of_sizes
+                )
+                ProductInCart.objects.bulk_create(
+                    [
+                        ProductInCart(
+                            user=user, product_id=product_id, size=str(size), number=1
+                        )
+                        for size in range(0, number_of_sizes, 2)
+                    ]
+                )
+
+                self._report(
+                    f"{number_of_sizes} размеров, запрос на размер",
+                    lambda: _get_available_sizes_per_size(user.pk, product_id),
+                    options["repeat"],
+                )
+                self._report(
+                    f"{number_of_sizes} размеров, anti-join",
+                    lambda: (
+                        _bump_cart_version(user.pk),
+                        _get_available_sizes(user.pk, product_id),
+                    ),
+                    options["repeat"],
+                )
+                self._report(
+                    f"{number_of_sizes} размеров, из кэша",
+                    lambda: _get_available_sizes(user.pk, product_id),
+                    options["repeat"],
+                )
+            transaction.set_rollback(True)
+
+    def _report(self, label: str, get_sizes: Callable, repeat: int) -> None:
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                started = perf_counter()
+                get_sizes()
+                timings.append(perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(
+            f"{label}: "
+            f"медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+            f"максимум {timings[-1] * 1000:.2f} мс, "
+            f"{len(context.captured_queries)} запросов"
+        )
@@ -0,0 +1,116 @@
+from time import perf_counter
+from typing import Callable
+
+from cart.services import _add_product_to_cart
+from cart.services import _remove_product
+from cart.store import cart_store
+from cart.views import CartView
+from cart.views import choose_size_view
+from cart.views import increase_view
+from cart.views import reduce_view
+from cart.views import remove_from_cart_view
+from commerce.factories import create_synthetic_catalog
+from commerce.models import Product
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django_redis import get_redis_connection
+
+SIZE = "44"
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет время, запросы к Postgres и команды Redis на действия "
+        "с корзиной при чтении корзины из БД и из Redis"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", nargs="+", type=int, default=[1, 10, 30, 100])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        number_of_products = max(options["lines"]) + 1
+        product_ids = create_synthetic_catalog(
+            number_of_products, out_of_stock_every=number_of_products
+        )[1:]
+        user = get_user_model().objects.create(email="benchmark-cart@example.com")
+        try:
+            for number_of_lines in options["lines"]:
+                for product_id in product_ids[:number_of_lines]:
+                    _add_product_to_cart(product_id, user.pk, SIZE)
+                self._report_interactions(
+                    user, product_ids[number_of_lines - 1], options["repeat"]
+                )
+                for product_id in product_ids[:number_of_lines]:
+                    _remove_product(product_id, user.pk, SIZE)
+        finally:
+            cart_store.invalidate(user.pk)
+            user.delete()
+            Product.objects.filter(pk__in=product_ids).delete()
+
+    def _report_interactions(self, user, product_id: int, repeat: int) -> None:
+        factory = RequestFactory()
+        data = {"user_id": user.pk, "product_id": product_id, "size": SIZE}
+
+        def get(view: Callable, url_name: str) -> Callable:
+            def call():
+                request = factory.get(reverse(url_name), data)
+                request.user = user
+                return view(request)
+
+            return call
+
+        view_cart = get(CartView.as_view(), "list_of_products_in_cart")
+        lines = cart_store.load(user.pk)
+
+        def view_cart_from_db():
+            cart_store.invalidate(user.pk)
+            view_cart().render()
+
+        self._report(f"{len(lines)} позиций, корзина из БД", view_cart_from_db, repeat)
+        self._report(
+            f"{len(lines)} позиций, корзина из Redis",
+            lambda: view_cart().render(),
+            repeat,
+        )
+        increase = get(increase_view, "increase")
+        reduce = get(reduce_view, "reduce")
+        self._report(
+            f"{len(lines)} позиций, увеличение и уменьшение",
+            lambda: (increase(), reduce()),
+            repeat,
+        )
+
+        remove = get(remove_from_cart_view, "remove_from_cart")
+        add = get(choose_size_view, "choose_size")
+        self._report(
+            f"{len(lines)} позиций, удаление и добавление",
+            lambda: (remove(), add()),
+            repeat,
+        )
+        if not cart_store.is_consistent(user.pk):
+            self.stderr.write("Корзина в Redis разошлась с БД")
+
+    def _report(self, label: str, interact: Callable, repeat: int) -> None:
+        redis = get_redis_connection("default")
+        timings = []
+        for _ in range(repeat):
+            commands = redis.info("stats")["total_commands_processed"]
+            with CaptureQueriesContext(connection) as context:
+                started = perf_counter()
+                interact()
+                timings.append(perf_counter() - started)
+            commands = redis.info("stats")["total_commands_processed"] - commands - 1
+
+        timings.sort()
+        self.stdout.write(
+            f"{label}: "
+            f"медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+            f"максимум {timings[-1] * 1000:.2f} мс, "
+            f"{len(context.captured_queries)} запросов, "
+            f"{commands} команд Redis"
+        )
@@ -0,0 +1,66 @@
+from time import perf_counter
+
+from cart.models import ProductInCart
+from cart.views import CheckoutView
+from commerce.factories import create_synthetic_catalog
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db import transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+CHECKOUT_DATA = {
+    "surname": "Иванов",
+    "name": "Иван",
+    "middle_name": "Иванович",
+    "address": "ул. Иванова, 5",
+    "phone_number": "+79997778822",
+}
+
+
+class Command(BaseCommand):
+    help = "Измеряет время оформления заказа в зависимости от размера корзины"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lines", nargs="+", type=int, default=[1, 10, 30, 100, 300]
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            product_ids = create_synthetic_catalog(max(options["lines"]))
+            user = get_user_model().objects.create(
+                email="benchmark-checkout@example.com"
+            )
+            for number_of_lines in options["lines"]:
+                self._report(user, product_ids[:number_of_lines], options["repeat"])
+            transaction.set_rollback(True)
+
+    def _report(self, user, product_ids: list[int], repeat: int) -> None:
+        view = CheckoutView.as_view()
+        timings = []
+        for _ in range(repeat):
+            ProductInCart.objects.bulk_create(
+                [
+                    ProductInCart(user=user, product_id=product_id, number=1)
+                    for product_id in product_ids
+                ]
+            )
+            request = RequestFactory().post(reverse("checkout"), CHECKOUT_DATA)
+            request.user = user
+
+            with CaptureQueriesContext(connection) as context:
+                started = perf_counter()
+                view(request)
+                timings.append(perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(
+            f"{len(product_ids)} позиций: "
+            f"медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+            f"максимум {timings[-1] * 1000:.2f} мс, "
+            f"{len(context.captured_queries)} запросов"
+        )
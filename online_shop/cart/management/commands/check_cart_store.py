@@ -0,0 +1,30 @@
+from cart.services import _invalidate_cart
+from cart.store import cart_store
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет корзины в Redis с таблицей товаров в корзине и сбрасывает "
+        "расходящиеся"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true")
+
+    def handle(self, *args, **options):
+        checked = 0
+        inconsistent = []
+        for user_id in cart_store.get_user_ids():
+            checked += 1
+            if not cart_store.is_consistent(user_id):
+                inconsistent.append(user_id)
+                self.stderr.write(f"Корзина пользователя {user_id} расходится с БД")
+                if options["fix"]:
+                    _invalidate_cart(user_id)
+
+        message = f"Проверено корзин: {checked}, расходится: {len(inconsistent)}"
+        if inconsistent and not options["fix"]:
+            self.stdout.write(self.style.ERROR(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.4 on 2026-10-18 17:58
+from django.conf import settings
+from django.db import migrations
+from django.db import models
+from django.db.models import Count
+from django.db.models import Min
+from django.db.models import Sum
+
+
+def merge_duplicate_products_in_cart(apps, schema_editor):
+    ProductInCart = apps.get_model("cart", "ProductInCart")
+    duplicates = (
+        ProductInCart.objects.order_by()
+        .values("user", "product", "size")
+        .annotate(count=Count("pk"), first=Min("pk"), total=Sum("number"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        ProductInCart.objects.filter(
+            user=duplicate["user"],
+            product=duplicate["product"],
+            size=duplicate["size"],
+        ).exclude(pk=duplicate["first"]).delete()
+        ProductInCart.objects.filter(pk=duplicate["first"]).update(
+            number=duplicate["total"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0001_initial"),
+        ("commerce", "0019_catalog_index_plan"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_products_in_cart, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="productincart",
+            constraint=models.UniqueConstraint(
+                fields=("user", "product", "size"),
+                name="unique_user_product_size",
+                nulls_distinct=False,
+            ),
+        ),
+    ]
@@ -16,6 +16,13 @@ class ProductInCart(models.Model):
         return self.product.name
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "product", "size"],
+                name="unique_user_product_size",
+                nulls_distinct=False,
+            ),
+        ]
         verbose_name = "Товар в корзине"
         verbose_name_plural = "Корзина"
 
@@ -1,139 +1,276 @@
+from functools import partial
+from typing import Any
 from typing import Optional
 
 from cart.models import Order
 from cart.models import OrderItem
 from cart.models import ProductInCart
+from cart.store import cart_store
 from commerce.models import Product
 from commerce.models import SizeAndNumber
+from commerce.services import _change_total_number
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import QuerySet
+from django.db.models import Subquery
+from django.db.models import Sum
+
+from online_shop.caching import bump_namespace_version
+from online_shop.caching import make_key
+from online_shop.settings import AVAILABLE_SIZES_TIMEOUT
+from online_shop.settings import CART_NAMESPACE
+from online_shop.settings import CART_SUMMARY_TIMEOUT
+
+
+def _get_available_sizes(user_id: str, product_id: str) -> list[str]:
+    key = make_key(CART_NAMESPACE.format(user_id=user_id), "sizes", product_id)
+    sizes = cache.get(key)
+    if sizes is None:
+        products_in_cart = ProductInCart.objects.filter(
+            user_id=user_id, product_id=product_id, size=OuterRef("size")
+        )
+        sizes = list(
+            SizeAndNumber.objects.filter(product_id=product_id, number__gt=0)
+            .filter(~Exists(products_in_cart))
+            .values_list("size", flat=True)
+        )
+        cache.set(key, sizes, timeout=AVAILABLE_SIZES_TIMEOUT)
+    return sizes
 
 
-def _get_product_by_product_id(product_id: str) -> Product:
-    return Product.in_stock.get(pk=product_id)
+def _get_product_slug(product_id: str) -> str:
+    return Product.objects.values_list("slug", flat=True).get(pk=product_id)
 
 
-def _get_available_sizes(user_id: str, product_id: str) -> list[int]:
-    product = _get_product_by_product_id(product_id)
+def _get_size_and_number_set(
+    product_id: str, size: Optional[str] = None
+) -> QuerySet[SizeAndNumber]:
+    if size is None:
+        first_size_and_number = SizeAndNumber.objects.filter(
+            product_id=product_id
+        ).values("pk")[:1]
+        return SizeAndNumber.objects.filter(pk=Subquery(first_size_and_number))
+    return SizeAndNumber.objects.filter(product_id=product_id, size=size)
+
+
+def _reserve_size_and_number(
+    product_id: str, size: Optional[str] = None, number: int = 1
+) -> bool:
+    with transaction.atomic(savepoint=False):
+        reserved = (
+            _get_size_and_number_set(product_id, size)
+            .filter(number__gte=number)
+            .update(number=F("number") - number)
+        )
+        if reserved:
+            _change_total_number(int(product_id), -number)
+    return bool(reserved)
 
-    sizes = []
-    for item in product.size_and_number_set.all():
-        if item.number > 0:
-            try:
-                ProductInCart.objects.get(
-                    product_id=product_id,
-                    user_id=user_id,
-                    size=item.size,
-                )
-            except ProductInCart.DoesNotExist:
-                sizes.append(item.size)
-    return sizes
 
+def _release_size_and_number(
+    product_id: str, size: Optional[str] = None, number: int = 1
+) -> bool:
+    with transaction.atomic(savepoint=False):
+        released = _get_size_and_number_set(product_id, size).update(
+            number=F("number") + number
+        )
+        if released:
+            _change_total_number(int(product_id), number)
+    return bool(released)
 
-def _change_size_and_number(product_id: str) -> None:
-    product = _get_product_by_product_id(product_id)
 
-    size_and_number = product.size_and_number_set.all()[0]
-    size_and_number.number -= 1
-    size_and_number.save()
+def _add_product_to_cart(
+    product_id: str, user_id: str, size: Optional[str] = None
+) -> bool:
+    try:
+        with transaction.atomic():
+            if not _reserve_size_and_number(product_id, size):
+                return False
+            _create_product_in_cart(
+                product_id=product_id, user_id=user_id, size=size, number=1
+            )
+    except IntegrityError:
+        return False
+    return True
 
 
 def _create_product_in_cart(
     product_id: str, user_id: str, number: int, size: Optional[str] = None
 ) -> ProductInCart:
+    _bump_cart_version_on_commit(user_id)
     if size is None:
-        return ProductInCart.objects.create(
+        product_in_cart = ProductInCart.objects.create(
+            product_id=product_id,
+            user_id=user_id,
+            number=number,
+        )
+    else:
+        product_in_cart = ProductInCart.objects.create(
             product_id=product_id,
             user_id=user_id,
+            size=size,
             number=number,
         )
-    return ProductInCart.objects.create(
-        product_id=product_id,
-        user_id=user_id,
-        size=size,
-        number=number,
+    transaction.on_commit(
+        partial(
+            cart_store.add_line,
+            user_id,
+            product_id,
+            size,
+            product_in_cart.pk,
+            number,
+        )
     )
+    return product_in_cart
 
 
-def _get_product_in_cart(
+def _get_products_in_cart_set(
     product_id: str, user_id: str, size: Optional[str] = None
-) -> ProductInCart:
+) -> QuerySet[ProductInCart]:
+    products_in_cart = ProductInCart.objects.filter(
+        product_id=product_id, user_id=user_id
+    )
     if size is None:
-        return ProductInCart.objects.get(product_id=product_id, user_id=user_id)
-    return ProductInCart.objects.get(product_id=product_id, user_id=user_id, size=size)
+        return products_in_cart
+    return products_in_cart.filter(size=size)
 
 
-def _get_size_and_number(
-    product_in_cart: ProductInCart, size: Optional[str] = None
-) -> SizeAndNumber:
-    if size is None:
-        return product_in_cart.product.size_and_number_set.all()[0]
-    return product_in_cart.product.size_and_number_set.get(size=size)
+def _remove_product(product_id: str, user_id: str, size: Optional[str]) -> None:
+    with transaction.atomic():
+        removed_product = (
+            _get_products_in_cart_set(product_id=product_id, user_id=user_id, size=size)
+            .select_for_update()
+            .get()
+        )
+        _release_size_and_number(
+            product_id=product_id, size=size, number=removed_product.number
+        )
+        removed_product.delete()
+        _bump_cart_version_on_commit(user_id)
+        transaction.on_commit(
+            partial(cart_store.remove_line, user_id, product_id, removed_product.size)
+        )
 
 
-def _restore_size_and_number(
-    product_in_cart: ProductInCart, size: Optional[str] = None
-) -> None:
-    size_and_number = _get_size_and_number(product_in_cart, size)
-    size_and_number.number += product_in_cart.number
-    size_and_number.save()
+def _get_products_in_cart_by_user(user: get_user_model()) -> list[ProductInCart]:
+    return ProductInCart.objects.filter(user=user)
 
 
-def _remove_product(product_id: str, user_id: str, size: Optional[str]) -> None:
-    removed_product = _get_product_in_cart(
-        product_id=product_id, user_id=user_id, size=size
+def _get_cart_lines(user: get_user_model()) -> list[ProductInCart]:
+    lines = cart_store.get_lines(user.pk)
+    products = Product.objects.in_bulk(
+        {line.product_id for line in lines if not ProductInCart.product.is_cached(line)}
     )
-    _restore_size_and_number(product_in_cart=removed_product, size=size)
-    removed_product.delete()
 
-
-def _get_products_in_cart_by_user(user: get_user_model()) -> list[ProductInCart]:
-    return ProductInCart.objects.filter(user=user)
+    cart_lines = []
+    for line in lines:
+        if line.product_id in products:
+            line.product = products[line.product_id]
+        if ProductInCart.product.is_cached(line):
+            cart_lines.append(line)
+    return cart_lines
 
 
 def _change_size_and_number_when_increasing(
     product_id: str, user_id: str, size: Optional[str]
-) -> None:
-    product_in_cart = _get_product_in_cart(
-        product_id=product_id, user_id=user_id, size=size
-    )
-    size_and_number = _get_size_and_number(product_in_cart=product_in_cart, size=size)
-    if size_and_number.number > 0:
-        size_and_number.number -= 1
-        size_and_number.save()
-        product_in_cart.number += 1
-        product_in_cart.save()
+) -> bool:
+    with transaction.atomic():
+        if not _get_products_in_cart_set(
+            product_id=product_id, user_id=user_id, size=size
+        ).update(number=F("number") + 1):
+            return False
+        if not _reserve_size_and_number(product_id=product_id, size=size):
+            transaction.set_rollback(True)
+            return False
+        _bump_cart_version_on_commit(user_id)
+        transaction.on_commit(
+            partial(cart_store.change_number, user_id, product_id, size, 1)
+        )
+    return True
 
 
 def _change_size_and_number_when_reducing(
     product_id: str, user_id: str, size: Optional[str]
-) -> None:
-    product_in_cart = _get_product_in_cart(
-        product_id=product_id, user_id=user_id, size=size
-    )
-    size_and_number = _get_size_and_number(product_in_cart=product_in_cart, size=size)
-    if product_in_cart.number > 1:
-        size_and_number.number += 1
-        size_and_number.save()
-        product_in_cart.number -= 1
-        product_in_cart.save()
+) -> bool:
+    with transaction.atomic():
+        if (
+            not _get_products_in_cart_set(
+                product_id=product_id, user_id=user_id, size=size
+            )
+            .filter(number__gt=1)
+            .update(number=F("number") - 1)
+        ):
+            return False
+        _release_size_and_number(product_id=product_id, size=size)
+        _bump_cart_version_on_commit(user_id)
+        transaction.on_commit(
+            partial(cart_store.change_number, user_id, product_id, size, -1)
+        )
+    return True
 
 
-def _find_total_price(object_list: list[ProductInCart]) -> float:
-    return sum(p.product.price * p.number for p in object_list)
+def _bump_cart_version(user_id: int | str) -> None:
+    bump_namespace_version(CART_NAMESPACE.format(user_id=user_id))
 
 
-def _find_total_quantity(object_list: list[ProductInCart]) -> int:
-    return sum(p.number for p in object_list)
+def _bump_cart_version_on_commit(user_id: int | str) -> None:
+    transaction.on_commit(partial(_bump_cart_version, user_id))
 
 
-def _create_order_items(user: get_user_model(), order: Order) -> None:
-    products_in_cart = _get_products_in_cart_by_user(user)
+def _invalidate_cart(user_id: int | str) -> None:
+    cart_store.invalidate(user_id)
+    _bump_cart_version(user_id)
 
-    for p in products_in_cart:
-        order_item = OrderItem.objects.create(
-            product=p.product, number=p.number, order=order
+
+def _invalidate_cart_on_commit(user_id: int | str) -> None:
+    transaction.on_commit(partial(_invalidate_cart, user_id))
+
+
+def _get_cart_quantity(user: get_user_model()) -> int:
+    return sum(line.number for line in cart_store.get_lines(user.pk))
+
+
+def _get_cart_summary(user: get_user_model()) -> dict[str, Any]:
+    key = make_key(CART_NAMESPACE.format(user_id=user.pk), "summary")
+    summary = cache.get(key)
+    if summary is None:
+        summary = ProductInCart.objects.filter(user=user).aggregate(
+            total_price=Sum(F("product__price") * F("number"), default=0),
+            total_quantity=Sum("number", default=0),
         )
-        if p.size:
-            order_item.size = p.size
-            order_item.save()
-        p.delete()
+        cache.set(key, summary, timeout=CART_SUMMARY_TIMEOUT)
+    return summary
+
+
+def _invalidate_cart_summaries_on_commit(product_id: int) -> None:
+    user_ids = (
+        ProductInCart.objects.filter(product_id=product_id)
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    for user_id in user_ids:
+        _bump_cart_version_on_commit(user_id)
+
+
+def _create_order_items(user: get_user_model(), order: Order) -> list[OrderItem]:
+    products_in_cart = list(_get_products_in_cart_by_user(user))
+
+    order_items = OrderItem.objects.bulk_create(
+        [
+            OrderItem(
+                product_id=p.product_id,
+                size=p.size or None,
+                number=p.number,
+                order=order,
+            )
+            for p in products_in_cart
+        ]
+    )
+    ProductInCart.objects.filter(pk__in=[p.pk for p in products_in_cart]).delete()
+    _invalidate_cart_on_commit(user.pk)
+    return order_items
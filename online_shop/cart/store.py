@@ -0,0 +1,163 @@
+import json
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+
+from cart.models import ProductInCart
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.client import Pipeline
+from redis.exceptions import WatchError
+
+from online_shop.settings import CART_LINES_KEY
+from online_shop.settings import CART_LINES_TIMEOUT
+
+LOADED_FIELD = "loaded"
+PK_FIELD_PREFIX = "pk"
+
+
+def _get_line_field(product_id: int | str, size: Optional[str]) -> str:
+    return json.dumps([int(product_id), size])
+
+
+class CartStore:
+    @property
+    def _redis(self):
+        return get_redis_connection("default")
+
+    @staticmethod
+    def _get_key(user_id: int | str) -> str:
+        return cache.make_key(CART_LINES_KEY.format(user_id=user_id))
+
+    def get_lines(self, user_id: int | str) -> list[ProductInCart]:
+        lines = self._parse_lines(user_id, self._redis.hgetall(self._get_key(user_id)))
+        if lines is None:
+            return self.load(user_id)
+        return lines
+
+    @staticmethod
+    def _parse_lines(
+        user_id: int | str, fields: dict[bytes, bytes]
+    ) -> Optional[list[ProductInCart]]:
+        fields = {field.decode(): int(value) for field, value in fields.items()}
+        if fields.pop(LOADED_FIELD, None) is None:
+            return None
+
+        lines = []
+        for field, number in fields.items():
+            if field.startswith(PK_FIELD_PREFIX):
+                continue
+            pk = fields.get(PK_FIELD_PREFIX + field)
+            if pk is None:
+                return None
+            product_id, size = json.loads(field)
+            lines.append(
+                ProductInCart(
+                    pk=pk,
+                    user_id=int(user_id),
+                    product_id=product_id,
+                    size=size,
+                    number=number,
+                )
+            )
+        lines.sort(key=lambda line: line.pk)
+        return lines
+
+    def load(self, user_id: int | str) -> list[ProductInCart]:
+        key = self._get_key(user_id)
+        with self._redis.pipeline() as pipeline:
+            pipeline.watch(key)
+            lines = list(
+                ProductInCart.objects.filter(user_id=user_id)
+                .select_related("product")
+                .order_by("pk")
+            )
+            if pipeline.hexists(key, LOADED_FIELD):
+                return lines
+
+            mapping = {LOADED_FIELD: 1}
+            for line in lines:
+                field = _get_line_field(line.product_id, line.size)
+                mapping[field] = line.number
+                mapping[PK_FIELD_PREFIX + field] = line.pk
+
+            pipeline.multi()
+            pipeline.delete(key)
+            pipeline.hset(key, mapping=mapping)
+            pipeline.expire(key, CART_LINES_TIMEOUT)
+            try:
+                pipeline.execute()
+            except WatchError:
+                pass
+        return lines
+
+    def add_line(
+        self,
+        user_id: int | str,
+        product_id: int | str,
+        size: Optional[str],
+        pk: int,
+        number: int,
+    ) -> None:
+        field = _get_line_field(product_id, size)
+        self._write(
+            user_id,
+            lambda pipeline, key: pipeline.hset(
+                key, mapping={field: number, PK_FIELD_PREFIX + field: pk}
+            ),
+        )
+
+    def change_number(
+        self, user_id: int | str, product_id: int | str, size: Optional[str], delta: int
+    ) -> None:
+        field = _get_line_field(product_id, size)
+        self._write(user_id, lambda pipeline, key: pipeline.hincrby(key, field, delta))
+
+    def remove_line(
+        self, user_id: int | str, product_id: int | str, size: Optional[str]
+    ) -> None:
+        field = _get_line_field(product_id, size)
+        self._write(
+            user_id,
+            lambda pipeline, key: pipeline.hdel(key, field, PK_FIELD_PREFIX + field),
+        )
+
+    def invalidate(self, user_id: int | str) -> None:
+        self._redis.delete(self._get_key(user_id))
+
+    def _write(
+        self, user_id: int | str, command: Callable[[Pipeline, str], Any]
+    ) -> None:
+        key = self._get_key(user_id)
+        pipeline = self._redis.pipeline()
+        command(pipeline, key)
+        pipeline.expire(key, CART_LINES_TIMEOUT)
+        pipeline.execute()
+
+    def get_user_ids(self) -> Iterator[int]:
+        pattern = self._get_key("*")
+        prefix = pattern[:-1]
+        for key in self._redis.scan_iter(match=pattern):
+            user_id = key.decode().removeprefix(prefix)
+            if user_id.isdigit():
+                yield int(user_id)
+
+    def is_consistent(self, user_id: int | str) -> bool:
+        fields = self._redis.hgetall(self._get_key(user_id))
+        if LOADED_FIELD.encode() not in fields:
+            return True
+        lines = self._parse_lines(user_id, fields)
+        if lines is None:
+            return False
+        actual = set(
+            ProductInCart.objects.filter(user_id=user_id).values_list(
+                "pk", "product_id", "size", "number"
+            )
+        )
+        return {
+            (line.pk, line.product_id, line.size, line.number) for line in lines
+        } == actual
+
+
+cart_store = CartStore()
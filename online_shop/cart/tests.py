@@ -1,16 +1,36 @@
+import threading
 from http import HTTPStatus
+from io import StringIO
+from unittest.mock import patch
 
 from cart.forms import CheckoutForm
 from cart.models import Order
 from cart.models import OrderItem
 from cart.models import ProductInCart
+from cart.services import _add_product_to_cart
 from cart.services import _get_available_sizes
+from cart.services import _get_cart_quantity
+from cart.services import _get_cart_summary
+from cart.services import _release_size_and_number
+from cart.services import _reserve_size_and_number
+from cart.store import cart_store
+from cart.store import LOADED_FIELD
+from cart.urls import query_budgets
+from cart.urls import urlpatterns
+from commerce.factories import create_synthetic_catalog
 from commerce.models import Product
 from commerce.models import SizeAndNumber
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from online_shop.testing import QueryBudgetMixin
+
 
 class AddToCartTestCase(TestCase):
     fixtures = [
@@ -219,6 +239,7 @@ class CartTestCase(TestCase):
     ]
 
     def setUp(self):
+        cache.clear()
         ProductInCart.objects.bulk_create(
             [
                 ProductInCart(
@@ -247,6 +268,61 @@ class CartTestCase(TestCase):
             list(context["products_in_cart"]),
             list(ProductInCart.objects.filter(user=user)),
         )
+        self.assertEqual(context["total_quantity"], 2)
+        self.assertEqual(
+            context["total_price"],
+            sum(p.product.price for p in ProductInCart.objects.filter(user=user)),
+        )
+
+    def test_cart_cursor_pages(self):
+        user = get_user_model().objects.get(email="user1@mail.ru")
+        ProductInCart.objects.bulk_create(
+            [
+                ProductInCart(user=user, product=product, number=1)
+                for product in Product.objects.exclude(pk__in=[4, 59])[:5]
+            ]
+        )
+        self.client.force_login(user)
+        path = reverse("list_of_products_in_cart")
+
+        products_in_cart = []
+        response = self.client.get(path)
+        while True:
+            products_in_cart += response.context["products_in_cart"]
+            page = response.context["page_obj"]
+            if not page.has_next():
+                break
+            response = self.client.get(f"{path}?{page.next_query}")
+
+        self.assertEqual(
+            products_in_cart,
+            list(ProductInCart.objects.filter(user=user).order_by("pk")),
+        )
+
+    def test_cart_query_count_does_not_depend_on_number_of_lines(self):
+        user = get_user_model().objects.get(email="user1@mail.ru")
+        product_ids = create_synthetic_catalog(100)
+        self.client.force_login(user)
+        path = reverse("list_of_products_in_cart")
+
+        query_counts = {}
+        for number_of_lines in (1, 10, 100):
+            ProductInCart.objects.filter(user=user).delete()
+            ProductInCart.objects.bulk_create(
+                [
+                    ProductInCart(user=user, product_id=product_id, number=1)
+                    for product_id in product_ids[:number_of_lines]
+                ]
+            )
+            cache.clear()
+            for store in ("cold", "warm"):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(path)
+                self.assertEqual(response.context["total_quantity"], number_of_lines)
+                query_counts.setdefault(store, set()).add(len(context.captured_queries))
+
+        self.assertEqual(len(query_counts["cold"]), 1, query_counts)
+        self.assertEqual(len(query_counts["warm"]), 1, query_counts)
 
     def test_cart_login_required(self):
         response = self.client.get(reverse("list_of_products_in_cart"))
@@ -582,6 +658,7 @@ class CheckoutTestCase(TestCase):
     ]
 
     def setUp(self):
+        cache.clear()
         user = get_user_model().objects.get(pk=2)
         self.user = user
         self.client.force_login(user)
@@ -704,6 +781,32 @@ class CheckoutTestCase(TestCase):
             OrderItem.objects.filter(product_id=59, number=1, order=order[0])
         )
 
+    def test_checkout_queries_do_not_depend_on_cart_size(self):
+        data = {
+            "surname": "Иванов",
+            "name": "Иван",
+            "middle_name": "Иванович",
+            "address": "ул. Иванова, 5",
+            "phone_number": "+79997778822",
+        }
+        with CaptureQueriesContext(connection) as small_cart:
+            self.client.post(reverse("checkout"), data)
+
+        ProductInCart.objects.bulk_create(
+            [
+                ProductInCart(user=self.user, product_id=product_id, number=1)
+                for product_id in create_synthetic_catalog(30)
+            ]
+        )
+        with CaptureQueriesContext(connection) as large_cart:
+            self.client.post(reverse("checkout"), data)
+
+        self.assertEqual(len(small_cart), len(large_cart))
+        self.assertFalse(ProductInCart.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            OrderItem.objects.filter(order=Order.objects.latest("pk")).count(), 30
+        )
+
     def test_message_about_order(self):
         data = {
             "surname": "Иванов",
@@ -717,3 +820,460 @@ class CheckoutTestCase(TestCase):
 
         self.assertTemplateUsed(response, "cart/message_about_order.html")
         self.assertEqual(context["title"], "Заказ оформлен")
+
+
+class StockReservationTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/users_user.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def test_reserve_chosen_size(self):
+        other_size = SizeAndNumber.objects.get(product_id=1, size="48")
+        size_and_number = SizeAndNumber.objects.get(product_id=1, size="50")
+
+        self.assertTrue(_reserve_size_and_number(product_id="1", size="50"))
+        other_size.refresh_from_db()
+        self.assertEqual(other_size.number, 3)
+        self.assertEqual(
+            SizeAndNumber.objects.get(pk=size_and_number.pk).number,
+            size_and_number.number - 1,
+        )
+
+    def test_reserve_more_than_in_stock(self):
+        size_and_number = SizeAndNumber.objects.get(product_id=59)
+
+        self.assertFalse(
+            _reserve_size_and_number(product_id="59", number=size_and_number.number + 1)
+        )
+        self.assertEqual(
+            SizeAndNumber.objects.get(pk=size_and_number.pk).number,
+            size_and_number.number,
+        )
+
+    def test_reserve_and_release_keep_total_number(self):
+        product = Product.objects.get(pk=59)
+        number = product.total_number
+
+        self.assertTrue(_reserve_size_and_number(product_id="59", number=number))
+        self.assertFalse(Product.in_stock.filter(pk=59).exists())
+        self.assertTrue(_release_size_and_number(product_id="59", number=number))
+        self.assertEqual(Product.in_stock.get(pk=59).total_number, number)
+
+    def test_add_sold_out_product_to_cart(self):
+        SizeAndNumber.objects.filter(product_id=59).update(number=0)
+
+        self.assertFalse(_add_product_to_cart(product_id="59", user_id="2"))
+        self.assertFalse(ProductInCart.objects.filter(product_id=59).exists())
+
+    def test_add_product_already_in_cart(self):
+        self.assertTrue(_add_product_to_cart(product_id="59", user_id="2"))
+        number = SizeAndNumber.objects.get(product_id=59).number
+
+        self.assertFalse(_add_product_to_cart(product_id="59", user_id="2"))
+        self.assertEqual(ProductInCart.objects.filter(product_id=59).count(), 1)
+        self.assertEqual(SizeAndNumber.objects.get(product_id=59).number, number)
+
+
+class StockReservationConcurrencyTestCase(TransactionTestCase):
+    number_of_threads = 20
+    attempts_per_thread = 5
+
+    def setUp(self):
+        create_synthetic_catalog(1, sizes=("48",))
+        self.size_and_number = SizeAndNumber.objects.get()
+        self.size_and_number.number = 30
+        self.size_and_number.save()
+
+    def run_in_threads(self, target):
+        barrier = threading.Barrier(self.number_of_threads)
+        results = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(self.attempts_per_thread):
+                    results.append(target())
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker) for _ in range(self.number_of_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_no_overselling(self):
+        number = self.size_and_number.number
+        results = self.run_in_threads(
+            lambda: _reserve_size_and_number(self.size_and_number.product_id, "48")
+        )
+
+        self.assertEqual(results.count(True), number)
+        self.assertEqual(SizeAndNumber.objects.get().number, 0)
+        self.assertEqual(Product.objects.get().total_number, 0)
+
+    def test_no_lost_updates(self):
+        number = self.size_and_number.number
+        product_id = self.size_and_number.product_id
+
+        def reserve_and_release():
+            if _reserve_size_and_number(product_id, "48"):
+                return _release_size_and_number(product_id, "48")
+            return False
+
+        self.run_in_threads(reserve_and_release)
+
+        self.assertEqual(SizeAndNumber.objects.get().number, number)
+        self.assertEqual(Product.objects.get().total_number, number)
+
+
+class AvailableSizesTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/users_user.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.get(pk=4)
+        self.product.size_and_number_set.all().delete()
+        SizeAndNumber.objects.bulk_create(
+            [
+                SizeAndNumber(product=self.product, size=str(size), number=size % 3)
+                for size in range(60)
+            ]
+        )
+
+    def test_available_sizes(self):
+        ProductInCart.objects.create(
+            user_id=2, product=self.product, size="1", number=1
+        )
+        expected = [str(size) for size in range(2, 60) if size % 3 and str(size) != "1"]
+
+        with self.assertNumQueries(1):
+            sizes = _get_available_sizes(user_id="2", product_id="4")
+
+        self.assertEqual(sorted(sizes, key=int), expected)
+        self.assertIn("1", _get_available_sizes(user_id="1", product_id="4"))
+
+    def test_available_sizes_follow_cart_version(self):
+        _get_available_sizes(user_id="2", product_id="4")
+        with self.assertNumQueries(0):
+            sizes = _get_available_sizes(user_id="2", product_id="4")
+        self.assertIn("1", sizes)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _add_product_to_cart(product_id="4", user_id="2", size="1")
+
+        self.assertNotIn("1", _get_available_sizes(user_id="2", product_id="4"))
+
+
+class CartSummaryTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/users_user.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.get(pk=2)
+        self.client.force_login(self.user)
+
+        ProductInCart.objects.bulk_create(
+            [
+                ProductInCart(user=self.user, product_id=4, size=48, number=2),
+                ProductInCart(user=self.user, product_id=59, number=1),
+            ]
+        )
+
+    def test_cart_summary(self):
+        with self.assertNumQueries(1):
+            summary = _get_cart_summary(self.user)
+
+        self.assertEqual(
+            summary,
+            {
+                "total_price": Product.objects.get(pk=4).price * 2
+                + Product.objects.get(pk=59).price,
+                "total_quantity": 3,
+            },
+        )
+
+    def test_cart_summary_is_cached(self):
+        summary = _get_cart_summary(self.user)
+        cart_store.load(self.user.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(_get_cart_summary(self.user), summary)
+            self.assertEqual(_get_cart_quantity(self.user), summary["total_quantity"])
+
+    def test_cart_summary_follows_price_changes(self):
+        summary = _get_cart_summary(self.user)
+        product = Product.objects.get(pk=4)
+        product.price += 1000
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        self.assertEqual(
+            _get_cart_summary(self.user)["total_price"],
+            summary["total_price"] + 2000,
+        )
+
+    def test_empty_cart_summary(self):
+        ProductInCart.objects.filter(user=self.user).delete()
+
+        self.assertEqual(
+            _get_cart_summary(self.user), {"total_price": 0, "total_quantity": 0}
+        )
+
+    def test_cart_summary_follows_cart_changes(self):
+        _get_cart_summary(self.user)
+        data = {"user_id": self.user.pk, "product_id": 4, "size": 48}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("increase"), data)
+        self.assertEqual(_get_cart_summary(self.user)["total_quantity"], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("remove_from_cart"), data)
+        self.assertEqual(_get_cart_summary(self.user)["total_quantity"], 1)
+
+    def test_cart_badge(self):
+        response = self.client.get(reverse("home"))
+
+        self.assertContains(response, '<span class="badge badge-light">3</span>')
+
+
+class CartStoreTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/users_user.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.get(pk=2)
+        self.client.force_login(self.user)
+
+        ProductInCart.objects.bulk_create(
+            [
+                ProductInCart(user=self.user, product_id=4, size=48, number=2),
+                ProductInCart(user=self.user, product_id=59, number=1),
+            ]
+        )
+
+    def assertStoreMatchesDatabase(self):
+        self.assertEqual(
+            [
+                (line.pk, line.product_id, line.size, line.number)
+                for line in cart_store.get_lines(self.user.pk)
+            ],
+            list(
+                ProductInCart.objects.filter(user=self.user)
+                .order_by("pk")
+                .values_list("pk", "product_id", "size", "number")
+            ),
+        )
+        self.assertTrue(cart_store.is_consistent(self.user.pk))
+
+    def test_cart_is_read_from_store(self):
+        path = reverse("list_of_products_in_cart")
+        self.client.get(path)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path)
+
+        self.assertFalse(
+            any(
+                ProductInCart._meta.db_table in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+        self.assertEqual(
+            list(response.context["products_in_cart"]),
+            list(ProductInCart.objects.filter(user=self.user).order_by("pk")),
+        )
+        self.assertEqual(
+            [p.product for p in response.context["products_in_cart"]],
+            [Product.objects.get(pk=4), Product.objects.get(pk=59)],
+        )
+
+    def test_empty_cart_is_stored(self):
+        ProductInCart.objects.filter(user=self.user).delete()
+        cart_store.load(self.user.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_store.get_lines(self.user.pk), [])
+
+    def test_store_follows_cart_changes(self):
+        cart_store.load(self.user.pk)
+        cases = [
+            ("choose_size", {"product_id": 1, "size": 48}),
+            ("increase", {"product_id": 4, "size": 48}),
+            ("reduce", {"product_id": 4, "size": 48}),
+            ("reduce", {"product_id": 4, "size": 48}),
+            ("increase", {"product_id": 59}),
+            ("remove_from_cart", {"product_id": 4, "size": 48}),
+            ("remove_from_cart", {"product_id": 59}),
+        ]
+        for url_name, data in cases:
+            with self.subTest(url_name=url_name, data=data):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.get(reverse(url_name), {"user_id": 2, **data})
+                self.assertStoreMatchesDatabase()
+
+    def test_checkout_clears_store(self):
+        cart_store.load(self.user.pk)
+        data = {
+            "surname": "Иванов",
+            "name": "Иван",
+            "middle_name": "Иванович",
+            "address": "ул. Иванова, 5",
+            "phone_number": "+79997778822",
+        }
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("checkout"), data)
+
+        self.assertEqual(cart_store.get_lines(self.user.pk), [])
+
+    def test_load_keeps_concurrent_write(self):
+        filter_lines = ProductInCart.objects.filter
+
+        def filter_with_concurrent_write(*args, **kwargs):
+            lines = filter_lines(*args, **kwargs)
+            cart_store.change_number(self.user.pk, 59, None, 1)
+            return lines
+
+        with patch.object(
+            ProductInCart.objects, "filter", side_effect=filter_with_concurrent_write
+        ):
+            lines = cart_store.load(self.user.pk)
+
+        self.assertEqual(len(lines), 2)
+        self.assertFalse(
+            cart_store._redis.hexists(cart_store._get_key(self.user.pk), LOADED_FIELD)
+        )
+        self.assertStoreMatchesDatabase()
+
+    def test_load_does_not_overwrite_loaded_cart(self):
+        cart_store.load(self.user.pk)
+        cart_store.change_number(self.user.pk, 59, None, 1)
+
+        cart_store.load(self.user.pk)
+
+        self.assertEqual(
+            [line.number for line in cart_store.get_lines(self.user.pk)], [2, 2]
+        )
+
+    def test_admin_changes_reset_cart_caches(self):
+        admin = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+        self.client.force_login(admin)
+        line = ProductInCart.objects.get(user=self.user, product_id=4)
+        self.assertNotIn("48", _get_available_sizes(self.user.pk, 4))
+        cart_store.load(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("admin:cart_productincart_delete", args=[line.pk]),
+                {"post": "yes"},
+            )
+
+        self.assertStoreMatchesDatabase()
+        self.assertIn("48", _get_available_sizes(self.user.pk, 4))
+
+    def test_check_cart_store(self):
+        cart_store.load(self.user.pk)
+        ProductInCart.objects.filter(user=self.user, product_id=59).update(number=5)
+
+        out = StringIO()
+        call_command("check_cart_store", stdout=out, stderr=StringIO())
+        self.assertIn("Проверено корзин: 1, расходится: 1", out.getvalue())
+        self.assertFalse(cart_store.is_consistent(self.user.pk))
+
+        call_command("check_cart_store", "--fix", stdout=out, stderr=StringIO())
+        self.assertStoreMatchesDatabase()
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/users_user.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+    query_budgets = query_budgets
+
+    @classmethod
+    def setUpTestData(cls):
+        create_synthetic_catalog(1000)
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.get(pk=2)
+        self.client.force_login(self.user)
+
+        ProductInCart.objects.bulk_create(
+            [
+                ProductInCart(user_id=2, product_id=4, size=48, number=2),
+                ProductInCart(user_id=2, product_id=59, number=2),
+            ]
+        )
+
+    def test_all_views_have_budgets(self):
+        self.assertAllViewsHaveBudgets(urlpatterns)
+
+    def test_cart_views(self):
+        cases = [
+            ("list_of_products_in_cart", None),
+            ("add_to_cart", {"user_id": 2, "product_id": 1, "is_size": 1}),
+            ("add_to_cart", {"user_id": 2, "product_id": 8, "is_size": 0}),
+            ("choose_size", {"user_id": 2, "product_id": 1, "size": 48}),
+            ("increase", {"user_id": 2, "product_id": 4, "size": 48}),
+            ("reduce", {"user_id": 2, "product_id": 4, "size": 48}),
+            ("increase", {"user_id": 2, "product_id": 59}),
+            ("reduce", {"user_id": 2, "product_id": 59}),
+            ("remove_from_cart", {"user_id": 2, "product_id": 4, "size": 48}),
+            ("checkout", None),
+            ("message_about_cart", None),
+            ("message_about_order", None),
+        ]
+        for url_name, data in cases:
+            with self.subTest(url_name=url_name, data=data):
+                self.assertQueryBudget(url_name, data=data)
+
+    def test_checkout(self):
+        data = {
+            "surname": "Иванов",
+            "name": "Иван",
+            "middle_name": "Иванович",
+            "address": "ул. Иванова, 5",
+            "phone_number": "+79997778822",
+        }
+
+        self.assertQueryBudget("checkout", data=data, method="post")
+
+    def test_cart_views_do_not_scale(self):
+        for url_name in ("list_of_products_in_cart", "checkout"):
+            with self.subTest(url_name=url_name):
+                self.assertQueryCountDoesNotScale(url_name)
@@ -30,3 +30,15 @@ urlpatterns = [
         name="message_about_order",
     ),
 ]
+
+query_budgets = {
+    "list_of_products_in_cart": 8,
+    "add_to_cart": 7,
+    "choose_size": 6,
+    "remove_from_cart": 6,
+    "message_about_cart": 3,
+    "increase": 6,
+    "reduce": 6,
+    "checkout": 9,
+    "message_about_order": 3,
+}
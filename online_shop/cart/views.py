@@ -1,15 +1,15 @@
 from cart.forms import CheckoutForm
 from cart.mixins import CartLoginRequiredMixin
-from cart.services import _change_size_and_number
+from cart.services import _add_product_to_cart
 from cart.services import _change_size_and_number_when_increasing
 from cart.services import _change_size_and_number_when_reducing
 from cart.services import _create_order_items
-from cart.services import _create_product_in_cart
-from cart.services import _find_total_price
-from cart.services import _find_total_quantity
 from cart.services import _get_available_sizes
-from cart.services import _get_products_in_cart_by_user
+from cart.services import _get_cart_lines
+from cart.services import _get_cart_summary
+from cart.services import _get_product_slug
 from cart.services import _remove_product
+from django.db import transaction
 from django.http import HttpRequest
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
@@ -20,6 +20,8 @@ from django.urls import reverse_lazy
 from django.views.generic import CreateView
 from django.views.generic import ListView
 
+from online_shop.pagination import CursorPaginationMixin
+
 
 def add_to_cart_view(request: HttpRequest) -> HttpResponse | HttpResponseRedirect:
     user_id = request.GET.get("user_id")
@@ -38,12 +40,9 @@ def add_to_cart_view(request: HttpRequest) -> HttpResponse | HttpResponseRedirec
             },
         )
 
-    _change_size_and_number(product_id)
-    product_in_cart = _create_product_in_cart(
-        product_id=product_id, user_id=user_id, number=1
-    )
+    _add_product_to_cart(product_id=product_id, user_id=user_id)
     return redirect(
-        to=reverse("product", kwargs={"product_slug": product_in_cart.product.slug})
+        to=reverse("product", kwargs={"product_slug": _get_product_slug(product_id)})
     )
 
 
@@ -52,13 +51,10 @@ def choose_size_view(request: HttpRequest) -> HttpResponseRedirect:
     product_id = request.GET.get("product_id")
     size = request.GET.get("size")
 
-    _change_size_and_number(product_id=product_id)
-    product_in_cart = _create_product_in_cart(
-        product_id=product_id, user_id=user_id, size=size, number=1
-    )
+    _add_product_to_cart(product_id=product_id, user_id=user_id, size=size)
 
     return redirect(
-        to=reverse("product", kwargs={"product_slug": product_in_cart.product.slug})
+        to=reverse("product", kwargs={"product_slug": _get_product_slug(product_id)})
     )
 
 
@@ -75,17 +71,18 @@ def remove_from_cart_view(request: HttpRequest) -> HttpResponseRedirect:
     return redirect(to=reverse("list_of_products_in_cart"))
 
 
-class CartView(CartLoginRequiredMixin, ListView):
+class CartView(CartLoginRequiredMixin, CursorPaginationMixin, ListView):
     template_name = "cart/cart.html"
     context_object_name = "products_in_cart"
     paginate_by = 3
 
     def get_queryset(self):
-        return _get_products_in_cart_by_user(user=self.request.user)
+        return _get_cart_lines(user=self.request.user)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["title"] = "Корзина"
+        context.update(_get_cart_summary(self.request.user))
         return context
 
 
@@ -129,13 +126,10 @@ class CheckoutView(CreateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["title"] = "Оформление заказа"
-
-        object_list = _get_products_in_cart_by_user(self.request.user)
-        context["total_price"] = _find_total_price(object_list)
-        context["total_quantity"] = _find_total_quantity(object_list)
-
+        context.update(_get_cart_summary(self.request.user))
         return context
 
+    @transaction.atomic
     def form_valid(self, form):
         order = form.save()
         _create_order_items(user=self.request.user, order=order)
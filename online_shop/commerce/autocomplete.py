@@ -0,0 +1,144 @@
+import re
+import sys
+import threading
+from bisect import bisect_left
+from typing import Optional
+
+from commerce.models import Product
+from django.urls import reverse
+
+from online_shop.caching import ChangeLog
+
+PRODUCT_NAME_INDEX_CHANGE_TIMEOUT = 60 * 60 * 24
+PRODUCT_NAME_INDEX_MAX_CHANGES = 1000
+
+product_name_changes = ChangeLog(
+    "product_name_index",
+    timeout=PRODUCT_NAME_INDEX_CHANGE_TIMEOUT,
+    max_changes=PRODUCT_NAME_INDEX_MAX_CHANGES,
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower().replace("ё", "е")))
+
+
+def _get_keys(name: str) -> list[str]:
+    words = _normalize(name).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class ProductNameIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys: list[str] = []
+            self._product_ids: list[int] = []
+            self._products: dict[int, tuple[str, str]] = {}
+            self._version: Optional[int] = None
+
+    def build(self) -> None:
+        version = product_name_changes.get_version()
+        products = list(Product.in_stock.values_list("pk", "name", "slug"))
+        entries = sorted(
+            (key, pk) for pk, name, _ in products for key in _get_keys(name)
+        )
+        with self._lock:
+            self._keys = [key for key, _ in entries]
+            self._product_ids = [pk for _, pk in entries]
+            self._products = {pk: (name, slug) for pk, name, slug in products}
+            self._version = version
+
+    def search(self, query: str, limit: int = 10) -> list[dict[str, str]]:
+        self._synchronize()
+
+        prefix = _normalize(query)
+        if not prefix:
+            return []
+
+        found = []
+        with self._lock:
+            i = bisect_left(self._keys, prefix)
+            while (
+                i < len(self._keys)
+                and self._keys[i].startswith(prefix)
+                and len(found) < limit
+            ):
+                pk = self._product_ids[i]
+                if pk not in found:
+                    found.append(pk)
+                i += 1
+            products = [self._products[pk] for pk in found]
+
+        return [
+            {"name": name, "url": reverse("product", kwargs={"product_slug": slug})}
+            for name, slug in products
+        ]
+
+    def get_size(self) -> int:
+        with self._lock:
+            return (
+                sys.getsizeof(self._keys)
+                + sum(sys.getsizeof(key) for key in self._keys)
+                + sys.getsizeof(self._product_ids)
+                + sum(sys.getsizeof(pk) for pk in self._products)
+                + sys.getsizeof(self._products)
+                + sum(
+                    sys.getsizeof(value)
+                    + sys.getsizeof(value[0])
+                    + sys.getsizeof(value[1])
+                    for value in self._products.values()
+                )
+            )
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def _synchronize(self) -> None:
+        version = product_name_changes.get_version()
+        if self._version is not None and version == self._version:
+            return
+
+        product_ids = None
+        if self._version is not None and version is not None:
+            product_ids = product_name_changes.get_changes(self._version, version)
+        if product_ids is None:
+            self.build()
+            return
+
+        products = Product.in_stock.filter(pk__in=product_ids).values_list(
+            "pk", "name", "slug"
+        )
+        with self._lock:
+            for pk in product_ids:
+                self._remove(pk)
+            for pk, name, slug in products:
+                self._add(pk, name, slug)
+            self._version = version
+
+    def _add(self, pk: int, name: str, slug: str) -> None:
+        for key in _get_keys(name):
+            i = bisect_left(self._keys, key)
+            self._keys.insert(i, key)
+            self._product_ids.insert(i, pk)
+        self._products[pk] = (name, slug)
+
+    def _remove(self, pk: int) -> None:
+        product = self._products.pop(pk, None)
+        if product is None:
+            return
+
+        for key in _get_keys(product[0]):
+            i = bisect_left(self._keys, key)
+            while i < len(self._keys) and self._keys[i] == key:
+                if self._product_ids[i] == pk:
+                    del self._keys[i]
+                    del self._product_ids[i]
+                    break
+                i += 1
+
+
+product_name_index = ProductNameIndex()
@@ -0,0 +1,41 @@
+from commerce.models import Product
+from commerce.services import _annotate_user_flags
+from django.contrib.auth import get_user_model
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.safestring import SafeString
+
+BADGES_PLACEHOLDER = "<!--badges:{}-->"
+BADGES_TEMPLATE_NAME = "commerce/product_badges.html"
+
+
+def fill_badges(
+    listing: SafeString, product_ids: list[int], user: get_user_model()
+) -> SafeString:
+    products = _annotate_user_flags([Product(pk=pk) for pk in product_ids], user)
+    for product in products:
+        listing = listing.replace(
+            BADGES_PLACEHOLDER.format(product.pk),
+            render_to_string(BADGES_TEMPLATE_NAME, {"p": product}),
+        )
+    return mark_safe(listing)
+
+
+class ProductBadgesMixin:
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        _annotate_user_flags(context[self.context_object_name], self.request.user)
+        return context
+
+
+class ListingBadgesMixin:
+    def personalize_listing_context(self, context: dict) -> dict:
+        context = super().personalize_listing_context(context)
+        if not self.request.user.is_authenticated:
+            return context
+        return {
+            **context,
+            "listing": fill_badges(
+                context["listing"], context.get("product_ids", []), self.request.user
+            ),
+        }
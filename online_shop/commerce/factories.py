@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+from commerce.models import Category
+from commerce.models import Product
+from commerce.models import SizeAndNumber
+from commerce.models import Subcategory
+from commerce.services import _invalidate_catalog
+from commerce.services import _update_search_vector
+from commerce.services import _update_total_number
+
+SYNTHETIC_SIZES = ("44", "46", "48", "50", "52")
+SYNTHETIC_NOUNS = (
+    "Кроссовки",
+    "Куртка",
+    "Платье",
+    "Рубашка",
+    "Брюки",
+    "Ботинки",
+    "Свитер",
+    "Шапка",
+    "Сумка",
+    "Часы",
+)
+SYNTHETIC_ADJECTIVES = (
+    "летние",
+    "зимние",
+    "кожаные",
+    "спортивные",
+    "классические",
+    "детские",
+    "женские",
+    "мужские",
+)
+
+
+def create_synthetic_catalog(
+    number_of_products: int,
+    sizes: tuple[str, ...] = SYNTHETIC_SIZES,
+    out_of_stock_every: int = 10,
+    batch_size: int = 5000,
+) -> list[int]:
+    category, _ = Category.objects.get_or_create(
+        slug="synthetic", defaults={"name": "Синтетическая категория"}
+    )
+    subcategory, _ = Subcategory.objects.get_or_create(
+        slug="synthetic", defaults={"name": "Синтетическая подкатегория"}
+    )
+    offset = Product.objects.filter(category=category).count()
+
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                name=_get_synthetic_name(offset + i),
+                slug=f"synthetic-product-{offset + i}",
+                description=(
+                    f"{_get_synthetic_name(offset + i + 1)} в подарок "
+                    f"при заказе до конца месяца"
+                ),
+                price=Decimal(100 + (offset + i) % 9900),
+                photo="products/synthetic.jpg",
+                category=category,
+                subcategory=subcategory,
+            )
+            for i in range(number_of_products)
+        ],
+        batch_size=batch_size,
+    )
+    SizeAndNumber.objects.bulk_create(
+        [
+            SizeAndNumber(
+                product=product,
+                size=size,
+                number=0 if i % out_of_stock_every == 0 else 3,
+            )
+            for i, product in enumerate(products)
+            for size in sizes
+        ],
+        batch_size=batch_size,
+    )
+
+    product_ids = [product.pk for product in products]
+    _update_total_number(product_ids=product_ids)
+    _update_search_vector(product_ids=product_ids)
+    _invalidate_catalog()
+    return product_ids
+
+
+def _get_synthetic_name(number: int) -> str:
+    noun = SYNTHETIC_NOUNS[number % len(SYNTHETIC_NOUNS)]
+    adjective = SYNTHETIC_ADJECTIVES[
+        number // len(SYNTHETIC_NOUNS) % len(SYNTHETIC_ADJECTIVES)
+    ]
+    return f"{noun} {adjective} {number}"
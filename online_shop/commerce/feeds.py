@@ -0,0 +1,86 @@
+from functools import partial
+from typing import Any
+
+from commerce.models import Product
+from django.core.cache import caches
+from django.db import transaction
+
+from online_shop.caching import get_or_build
+from online_shop.settings import LISTING_TIMEOUT
+from online_shop.settings import NEWEST_PRODUCTS_KEY
+from online_shop.settings import NEWEST_PRODUCTS_LIMIT
+from online_shop.settings import REBUILD_LOCK_TIMEOUT
+
+CARD_FIELDS = ("id", "name", "slug", "price", "photo", "created_at")
+
+
+def _get_sort_key(card: dict[str, Any]) -> tuple:
+    return card["created_at"], card["id"]
+
+
+def _get_newest_cards() -> list[dict[str, Any]]:
+    return list(
+        Product.in_stock.order_by("-created_at", "-id").values(*CARD_FIELDS)[
+            :NEWEST_PRODUCTS_LIMIT
+        ]
+    )
+
+
+class NewestProductsFeed:
+    lock_key = f"{NEWEST_PRODUCTS_KEY}:lock"
+    dirty_key = f"{NEWEST_PRODUCTS_KEY}:dirty"
+
+    def get_products(self) -> list[Product]:
+        cache = caches["fragments"]
+        values = cache.get_many([NEWEST_PRODUCTS_KEY, self.dirty_key])
+        cards = values.get(NEWEST_PRODUCTS_KEY)
+        if self.dirty_key in values:
+            cache.delete_many([self.dirty_key, NEWEST_PRODUCTS_KEY])
+            cards = None
+        if cards is None:
+            cards = get_or_build(
+                NEWEST_PRODUCTS_KEY,
+                _get_newest_cards,
+                alias="fragments",
+                timeout=LISTING_TIMEOUT,
+            )
+        return [Product(**card) for card in cards]
+
+    def update(self, product_id: int) -> None:
+        cache = caches["fragments"]
+        if not cache.add(self.lock_key, 1, timeout=REBUILD_LOCK_TIMEOUT):
+            cache.set(self.dirty_key, 1, timeout=LISTING_TIMEOUT)
+            return
+
+        try:
+            cards = cache.get(NEWEST_PRODUCTS_KEY)
+            if cards is None:
+                return
+
+            card = Product.in_stock.filter(pk=product_id).values(*CARD_FIELDS).first()
+            was_full = len(cards) >= NEWEST_PRODUCTS_LIMIT
+            cards = [item for item in cards if item["id"] != product_id]
+            if card is not None and (
+                len(cards) < NEWEST_PRODUCTS_LIMIT
+                or _get_sort_key(card) > _get_sort_key(cards[-1])
+            ):
+                cards.append(card)
+                cards.sort(key=_get_sort_key, reverse=True)
+                del cards[NEWEST_PRODUCTS_LIMIT:]
+            if was_full and len(cards) < NEWEST_PRODUCTS_LIMIT:
+                cards = _get_newest_cards()
+            cache.set(NEWEST_PRODUCTS_KEY, cards, timeout=LISTING_TIMEOUT)
+        finally:
+            if cache.delete(self.dirty_key):
+                cache.delete(NEWEST_PRODUCTS_KEY)
+            cache.delete(self.lock_key)
+
+    @staticmethod
+    def invalidate() -> None:
+        caches["fragments"].delete(NEWEST_PRODUCTS_KEY)
+
+    def register_change(self, product_id: int) -> None:
+        transaction.on_commit(partial(self.update, product_id))
+
+
+newest_products_feed = NewestProductsFeed()
@@ -8,6 +8,8 @@ class SearchForm(forms.Form):
             attrs={
                 "class": "search-input",
                 "placeholder": "Введите запрос",
+                "list": "search-suggestions",
+                "autocomplete": "off",
             }
         ),
     )
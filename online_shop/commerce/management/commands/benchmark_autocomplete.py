@@ -0,0 +1,46 @@
+from time import perf_counter
+
+from commerce.autocomplete import ProductNameIndex
+from commerce.factories import create_synthetic_catalog
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Измеряет память и скорость индекса автодополнения"
+
+    queries = ("к", "кр", "крос", "кроссовки", "зимние", "шапка мужские", "часы 99")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products", nargs="+", type=int, default=[10_000, 100_000]
+        )
+        parser.add_argument("--repeat", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for number_of_products in options["products"]:
+            with transaction.atomic():
+                create_synthetic_catalog(number_of_products)
+                self._report(options["repeat"])
+                transaction.set_rollback(True)
+
+    def _report(self, repeat: int) -> None:
+        index = ProductNameIndex()
+        started = perf_counter()
+        index.build()
+        build_time = perf_counter() - started
+
+        size = index.get_size()
+        self.stdout.write(
+            f"{len(index)} товаров: построение {build_time * 1000:.0f} мс, "
+            f"память {size / 2**20:.1f} МБ "
+            f"({size / len(index) * 10_000 / 2**20:.2f} МБ на 10 тыс. товаров)"
+        )
+
+        for query in self.queries:
+            started = perf_counter()
+            for _ in range(repeat):
+                index.search(query)
+            self.stdout.write(
+                f"  «{query}»: {(perf_counter() - started) / repeat * 10**6:.1f} мкс"
+            )
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from commerce.models import Product
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from online_shop.loadtesting import get_free_port
+from online_shop.loadtesting import get_percentile
+from online_shop.loadtesting import run_load
+from online_shop.loadtesting import start_gunicorn
+
+WSGI = ("online_shop.wsgi:application", "sync")
+ASGI = ("online_shop.asgi:application", "uvicorn.workers.UvicornWorker")
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает количество новых соединений с Postgres и задержку "
+        "с постоянными соединениями и без них"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None)
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--conn-max-age", type=int, default=60)
+        parser.add_argument("--pgbouncer-host", default=None)
+        parser.add_argument("--pgbouncer-port", type=int, default=6432)
+        parser.add_argument("--requests", type=int, default=300)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--timeout", type=float, default=10)
+
+    def handle(self, *args, **options):
+        path = options["path"] or Product.in_stock.first().get_absolute_url()
+        scenarios = [
+            ("sync, CONN_MAX_AGE=0", WSGI, {"CONN_MAX_AGE": "0"}),
+            (
+                f"sync, CONN_MAX_AGE={options['conn_max_age']}",
+                WSGI,
+                {"CONN_MAX_AGE": str(options["conn_max_age"])},
+            ),
+            ("asgi, CONN_MAX_AGE=0", ASGI, {"CONN_MAX_AGE": "0"}),
+        ]
+        if options["pgbouncer_host"]:
+            pgbouncer = {
+                "PGBOUNCER": "1",
+                "POSTGRES_HOST": options["pgbouncer_host"],
+                "POSTGRES_PORT": str(options["pgbouncer_port"]),
+                "CONN_MAX_AGE": "0",
+            }
+            scenarios += [
+                ("sync, PgBouncer", WSGI, pgbouncer),
+                ("asgi, PgBouncer", ASGI, pgbouncer),
+            ]
+
+        for label, (application, worker_class), env in scenarios:
+            port = get_free_port()
+            server = start_gunicorn(
+                application,
+                port,
+                ["--worker-class", worker_class, "--workers", str(options["workers"])],
+                env=env,
+            )
+            try:
+                sessions = self._get_sessions()
+                throughput, latencies, failed = asyncio.run(
+                    run_load(
+                        port,
+                        path,
+                        options["requests"],
+                        options["concurrency"],
+                        options["timeout"],
+                    )
+                )
+            finally:
+                server.terminate()
+                server.wait()
+            time.sleep(1)
+            sessions = self._get_sessions() - sessions
+
+            self.stdout.write(
+                f"{label}: {throughput:.1f} запросов/с, "
+                f"p50 {get_percentile(latencies, 0.5) * 1000:.2f} мс, "
+                f"p99 {get_percentile(latencies, 0.99) * 1000:.2f} мс, "
+                f"новых соединений с Postgres {sessions}, ошибок {failed}"
+            )
+
+    @staticmethod
+    def _get_sessions() -> int:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_stat_clear_snapshot()")
+            cursor.execute(
+                "SELECT sessions FROM pg_stat_database WHERE datname = current_database()"
+            )
+            return cursor.fetchone()[0]
@@ -0,0 +1,106 @@
+import asyncio
+import csv
+import itertools
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from online_shop.loadtesting import get_free_port
+from online_shop.loadtesting import get_percentile
+from online_shop.loadtesting import run_load
+from online_shop.loadtesting import start_gunicorn
+
+APPLICATIONS = {
+    "uvicorn.workers.UvicornWorker": "online_shop.asgi:application",
+    "sync": "online_shop.wsgi:application",
+    "gthread": "online_shop.wsgi:application",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Перебирает конфигурации gunicorn из gunicorn.conf.py и измеряет "
+        "пропускную способность и p99 задержки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None)
+        parser.add_argument(
+            "--worker-classes",
+            nargs="+",
+            choices=APPLICATIONS,
+            default=["uvicorn.workers.UvicornWorker", "gthread"],
+        )
+        parser.add_argument(
+            "--workers",
+            nargs="+",
+            type=int,
+            default=[0, 1, 2, 4],
+            help="0 — количество, рассчитанное по CPU и памяти",
+        )
+        parser.add_argument("--threads", nargs="+", type=int, default=[0])
+        parser.add_argument("--preload", nargs="+", choices=["0", "1"], default=["1"])
+        parser.add_argument("--requests", type=int, default=300)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--timeout", type=float, default=10)
+        parser.add_argument("--output", default=None)
+
+    def handle(self, *args, **options):
+        path = options["path"] or reverse("home")
+        results = []
+        for worker_class, workers, threads, preload in itertools.product(
+            options["worker_classes"],
+            options["workers"],
+            options["threads"],
+            options["preload"],
+        ):
+            port = get_free_port()
+            server = start_gunicorn(
+                APPLICATIONS[worker_class],
+                port,
+                [],
+                env={
+                    "GUNICORN_WORKER_CLASS": worker_class,
+                    "GUNICORN_WORKERS": str(workers),
+                    "GUNICORN_THREADS": str(threads),
+                    "GUNICORN_PRELOAD": preload,
+                },
+            )
+            try:
+                throughput, latencies, failed = asyncio.run(
+                    run_load(
+                        port,
+                        path,
+                        options["requests"],
+                        options["concurrency"],
+                        options["timeout"],
+                    )
+                )
+            finally:
+                server.terminate()
+                server.wait()
+
+            result = {
+                "worker_class": worker_class,
+                "workers": workers or "auto",
+                "threads": threads or "auto",
+                "preload": preload,
+                "requests_per_second": round(throughput, 1),
+                "p50_ms": round(get_percentile(latencies, 0.5) * 1000, 2),
+                "p99_ms": round(get_percentile(latencies, 0.99) * 1000, 2),
+                "failed": failed,
+            }
+            results.append(result)
+            self.stdout.write(
+                f"{worker_class} workers={result['workers']} "
+                f"threads={result['threads']} preload={preload}: "
+                f"{result['requests_per_second']} запросов/с, "
+                f"p50 {result['p50_ms']} мс, p99 {result['p99_ms']} мс, "
+                f"ошибок {failed}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=results[0].keys())
+                writer.writeheader()
+                writer.writerows(results)
@@ -0,0 +1,50 @@
+from collections import Counter
+from time import perf_counter
+from typing import Optional
+from urllib.request import Request
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from online_shop.settings import NGINX_URL
+
+
+class Command(BaseCommand):
+    help = "Сравнивает задержку ответов nginx при попадании в кэш и при промахе"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default=NGINX_URL)
+        parser.add_argument("--path", default=None)
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        url = options["base_url"] + (options["path"] or reverse("home"))
+        self._fetch(url)
+
+        for label, cookie in (
+            ("промах (cookie сессии)", f"{settings.SESSION_COOKIE_NAME}=benchmark"),
+            ("попадание (аноним)", None),
+        ):
+            timings = []
+            statuses = Counter()
+            for _ in range(options["requests"]):
+                started = perf_counter()
+                statuses[self._fetch(url, cookie)] += 1
+                timings.append(perf_counter() - started)
+
+            timings.sort()
+            self.stdout.write(
+                f"{label}: "
+                f"медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+                f"p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} мс, "
+                f"X-Cache-Status {dict(statuses)}"
+            )
+
+    @staticmethod
+    def _fetch(url: str, cookie: Optional[str] = None) -> str:
+        request = Request(url, headers={"Cookie": cookie} if cookie else {})
+        with urlopen(request, timeout=10) as response:
+            response.read()
+            return response.headers.get("X-Cache-Status", "-")
@@ -0,0 +1,39 @@
+from time import perf_counter
+
+from commerce.factories import create_synthetic_catalog
+from commerce.models import Product
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Измеряет время выдачи страницы каталога на синтетических данных"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products", nargs="+", type=int, default=[10_000, 100_000]
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        for number_of_products in options["products"]:
+            with transaction.atomic():
+                create_synthetic_catalog(number_of_products)
+                self._report(number_of_products, options["repeat"])
+                transaction.set_rollback(True)
+
+    def _report(self, number_of_products: int, repeat: int) -> None:
+        timings = []
+        for _ in range(repeat):
+            started = perf_counter()
+            products = Product.in_stock.filter(category__slug="synthetic")
+            products.count()
+            list(products.order_by("price")[:6])
+            timings.append(perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(
+            f"{number_of_products} товаров: "
+            f"медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+            f"максимум {timings[-1] * 1000:.2f} мс"
+        )
@@ -0,0 +1,73 @@
+from time import perf_counter
+from typing import Callable
+from typing import Optional
+
+from commerce.factories import create_synthetic_catalog
+from commerce.models import Product
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from online_shop.pagination import CURSOR_AFTER
+from online_shop.pagination import CursorPaginator
+from online_shop.pagination import encode_cursor
+
+PER_PAGE = 6
+
+
+class Command(BaseCommand):
+    help = "Сравнивает offset- и cursor-пагинацию на первой и глубокой странице"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument("--pages", nargs="+", type=int, default=[1, 1000])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            create_synthetic_catalog(options["products"])
+            products = Product.in_stock.filter(category__slug="synthetic")
+            for ordering in (("-created_at",), ("price",)):
+                ordered_products = products.order_by(*ordering)
+                for number in options["pages"]:
+                    cursor = self._get_cursor(ordered_products, number)
+                    self._report(
+                        f"offset {ordering[0]} страница {number}",
+                        lambda: list(
+                            Paginator(ordered_products, PER_PAGE).page(number)
+                        ),
+                        options["repeat"],
+                    )
+                    self._report(
+                        f"cursor {ordering[0]} страница {number}",
+                        lambda: list(
+                            CursorPaginator(ordered_products, PER_PAGE).page(cursor)
+                        ),
+                        options["repeat"],
+                    )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _get_cursor(products, number: int) -> Optional[str]:
+        if number == 1:
+            return None
+        paginator = CursorPaginator(products, PER_PAGE)
+        previous = paginator.object_list[(number - 1) * PER_PAGE - 1]
+        return encode_cursor(
+            CURSOR_AFTER,
+            [getattr(previous, name) for name, _ in paginator.ordering],
+        )
+
+    def _report(self, label: str, fetch_page: Callable, repeat: int) -> None:
+        timings = []
+        for _ in range(repeat):
+            started = perf_counter()
+            fetch_page()
+            timings.append(perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(
+            f"{label}: "
+            f"медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+            f"максимум {timings[-1] * 1000:.2f} мс"
+        )
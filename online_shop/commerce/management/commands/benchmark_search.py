@@ -0,0 +1,50 @@
+from time import perf_counter
+
+from commerce.factories import create_synthetic_catalog
+from commerce.models import Product
+from commerce.services import _get_products_when_searching
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Измеряет время поиска товаров на синтетическом каталоге"
+
+    queries = ("кроссовки", "кожаные ботинки", "зимн", "крососвки", "шапка 4242")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            create_synthetic_catalog(options["products"])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE commerce_product")
+
+            for query in self.queries:
+                self._report(
+                    f"полнотекстовый поиск «{query}»",
+                    lambda: list(_get_products_when_searching(query)[:6]),
+                    options["repeat"],
+                )
+                self._report(
+                    f"istartswith «{query}»",
+                    lambda: list(Product.in_stock.filter(name__istartswith=query)[:6]),
+                    options["repeat"],
+                )
+            transaction.set_rollback(True)
+
+    def _report(self, label: str, search, repeat: int) -> None:
+        timings = []
+        for _ in range(repeat):
+            started = perf_counter()
+            search()
+            timings.append(perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(
+            f"{label}: медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+            f"максимум {timings[-1] * 1000:.2f} мс"
+        )
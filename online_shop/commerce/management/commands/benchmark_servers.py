@@ -0,0 +1,90 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from online_shop.loadtesting import get_free_port
+from online_shop.loadtesting import get_percentile
+from online_shop.loadtesting import run_load
+from online_shop.loadtesting import start_gunicorn
+
+SERVERS = {
+    "sync": ("online_shop.wsgi:application", "sync"),
+    "asgi": ("online_shop.asgi:application", "uvicorn.workers.UvicornWorker"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность sync- и ASGI-воркеров gunicorn "
+        "при одновременных медленных клиентах"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None)
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--slow-clients", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--timeout", type=float, default=5)
+
+    def handle(self, *args, **options):
+        path = options["path"] or reverse("home")
+        for mode, (application, worker_class) in SERVERS.items():
+            port = get_free_port()
+            server = start_gunicorn(
+                application,
+                port,
+                [
+                    "--worker-class",
+                    worker_class,
+                    "--workers",
+                    str(options["workers"]),
+                ],
+            )
+            try:
+                throughput, latencies, failed = asyncio.run(
+                    self._load(port, path, options)
+                )
+            finally:
+                server.terminate()
+                server.wait()
+
+            self.stdout.write(
+                f"{mode}: {throughput:.1f} запросов/с, "
+                f"медиана {get_percentile(latencies, 0.5) * 1000:.2f} мс, "
+                f"p95 {get_percentile(latencies, 0.95) * 1000:.2f} мс, "
+                f"ошибок {failed} из {options['requests']}"
+            )
+
+    async def _load(self, port: int, path: str, options) -> tuple[float, list, int]:
+        slow_clients = [
+            asyncio.create_task(self._slow_client(port))
+            for _ in range(options["slow_clients"])
+        ]
+        await asyncio.sleep(0.5)
+
+        result = await run_load(
+            port,
+            path,
+            options["requests"],
+            options["concurrency"],
+            options["timeout"],
+        )
+
+        for task in slow_clients:
+            task.cancel()
+        await asyncio.gather(*slow_clients, return_exceptions=True)
+        return result
+
+    @staticmethod
+    async def _slow_client(port: int) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n")
+            while True:
+                await writer.drain()
+                await asyncio.sleep(1)
+                writer.write(b"X-Slow-Client: 1\r\n")
+        finally:
+            writer.close()
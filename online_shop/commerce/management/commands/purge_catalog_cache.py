@@ -0,0 +1,63 @@
+import time
+from urllib.error import URLError
+from urllib.request import Request
+from urllib.request import urlopen
+
+from commerce.services import _get_catalog_cache_urls
+from commerce.services import _get_product_cache_urls
+from commerce.services import product_page_changes
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from online_shop.settings import CACHE_PURGE_VERSION_KEY
+from online_shop.settings import NGINX_PURGE_URL
+
+
+class Command(BaseCommand):
+    help = (
+        "Обновляет в кэше nginx страницы каталога, затронутые изменениями "
+        "товаров и остатков"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_ids", nargs="*", type=int)
+        parser.add_argument("--all", action="store_true")
+        parser.add_argument("--interval", type=float, default=0)
+
+    def handle(self, *args, **options):
+        if options["product_ids"]:
+            self._purge(_get_product_cache_urls(options["product_ids"]))
+        elif options["all"]:
+            self._purge(_get_catalog_cache_urls())
+        else:
+            self._purge_changes()
+            while options["interval"]:
+                time.sleep(options["interval"])
+                self._purge_changes()
+
+    def _purge_changes(self) -> None:
+        version = product_page_changes.get_version()
+        purged_version = cache.get(CACHE_PURGE_VERSION_KEY)
+        if version is None or version == purged_version:
+            return
+
+        product_ids = None
+        if purged_version is not None:
+            product_ids = product_page_changes.get_changes(purged_version, version)
+        if product_ids is None:
+            self._purge(_get_catalog_cache_urls())
+        else:
+            self._purge(_get_product_cache_urls(product_ids))
+        cache.set(CACHE_PURGE_VERSION_KEY, version, timeout=None)
+
+    def _purge(self, urls: list[str]) -> None:
+        failed = 0
+        for url in urls:
+            request = Request(f"{NGINX_PURGE_URL}{url}")
+            try:
+                with urlopen(request, timeout=5) as response:
+                    response.read()
+            except (URLError, TimeoutError) as error:
+                failed += 1
+                self.stderr.write(f"{url}: {error}")
+        self.stdout.write(f"Обновлено страниц: {len(urls) - failed} из {len(urls)}")
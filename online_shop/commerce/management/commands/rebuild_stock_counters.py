@@ -0,0 +1,14 @@
+from commerce.services import _invalidate_catalog
+from commerce.services import _update_total_number
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает общее количество товаров на складе по размерам"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = _update_total_number()
+        _invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано товаров: {updated}"))
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.4 on 2026-10-18 17:07
+from django.db import migrations
+from django.db import models
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_total_number(apps, schema_editor):
+    Product = apps.get_model("commerce", "Product")
+    SizeAndNumber = apps.get_model("commerce", "SizeAndNumber")
+
+    total_number = (
+        SizeAndNumber.objects.filter(product_id=OuterRef("pk"))
+        .values("product_id")
+        .annotate(total=Sum("number"))
+        .values("total")
+    )
+    Product.objects.update(total_number=Coalesce(Subquery(total_number), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("commerce", "0015_remove_orderitem_order_remove_orderitem_product_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="total_number",
+            field=models.PositiveIntegerField(
+                db_index=True,
+                default=0,
+                editable=False,
+                verbose_name="Общее количество",
+            ),
+        ),
+        migrations.RunPython(fill_total_number, migrations.RunPython.noop),
+    ]
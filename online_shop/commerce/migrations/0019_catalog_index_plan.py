@@ -0,0 +1,81 @@
+# Generated by Django 5.0.4 on 2026-10-18 17:58
+from django.db import migrations
+from django.db import models
+from django.db.models import Count
+from django.db.models import Min
+from django.db.models import Sum
+
+
+def merge_duplicate_sizes(apps, schema_editor):
+    SizeAndNumber = apps.get_model("commerce", "SizeAndNumber")
+    duplicates = (
+        SizeAndNumber.objects.order_by()
+        .values("product", "size")
+        .annotate(count=Count("pk"), first=Min("pk"), total=Sum("number"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        SizeAndNumber.objects.filter(
+            product=duplicate["product"], size=duplicate["size"]
+        ).exclude(pk=duplicate["first"]).delete()
+        SizeAndNumber.objects.filter(pk=duplicate["first"]).update(
+            number=duplicate["total"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("commerce", "0018_product_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, verbose_name="Время появления"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("total_number__gt", 0)),
+                fields=["category", "-created_at", "-id"],
+                name="product_category_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("total_number__gt", 0)),
+                fields=["category", "price", "id"],
+                name="product_category_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("total_number__gt", 0)),
+                fields=["category", "subcategory", "-created_at", "-id"],
+                name="product_subcat_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("total_number__gt", 0)),
+                fields=["category", "subcategory", "price", "id"],
+                name="product_subcat_price_idx",
+            ),
+        ),
+        migrations.RunPython(merge_duplicate_sizes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="sizeandnumber",
+            constraint=models.UniqueConstraint(
+                fields=("product", "size"),
+                name="unique_product_size",
+                nulls_distinct=False,
+            ),
+        ),
+    ]
@@ -1,6 +1,13 @@
+from typing import Optional
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 
+from online_shop.caching import aget_or_build
+from online_shop.settings import LISTING_TIMEOUT
+
 
 class DisplayMixin:
     def __str__(self):
@@ -10,11 +17,47 @@ class DisplayMixin:
 class OrderedSearchMixin:
     def get_ordered_queryset(self, products):
         if self.request.GET.get("sort", None) == "price_desc":
-            return products.order_by("-price")
+            return products.order_by("-price", *products.query.order_by)
         if self.request.GET.get("sort", None) == "price_asc":
-            return products.order_by("price")
+            return products.order_by("price", *products.query.order_by)
+        if self.request.GET.get("sort", None) == "date":
+            return products.order_by("-created_at")
         return products
 
 
+class CachedListingMixin:
+    listing_template_name = None
+    cached_context_names = ("title", "cat_selected", "listing", "product_ids")
+
+    def get_listing_cache_key(self) -> Optional[str]:
+        return None
+
+    def personalize_listing_context(self, context: dict) -> dict:
+        return context
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = []
+        context = {}
+
+        def build_listing_context():
+            self.object_list = self.get_queryset()
+            context.update(self.get_context_data())
+            context["listing"] = render_to_string(self.listing_template_name, context)
+            context["product_ids"] = [p.pk for p in context[self.context_object_name]]
+            return {name: context[name] for name in self.cached_context_names}
+
+        key = await sync_to_async(self.get_listing_cache_key)()
+        if key is None:
+            cached_context = await sync_to_async(build_listing_context)()
+        else:
+            cached_context = await aget_or_build(
+                key, build_listing_context, alias="fragments", timeout=LISTING_TIMEOUT
+            )
+        context = await sync_to_async(self.personalize_listing_context)(
+            context or cached_context
+        )
+        return self.render_to_response(context)
+
+
 class WishlistLoginRequiredMixin(LoginRequiredMixin):
     login_url = reverse_lazy("message_about_wishlist")
@@ -1,20 +1,16 @@
 from commerce.mixins import DisplayMixin
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Q
 from django.urls import reverse
 
 
 class ProductsInStockManager(models.Manager):
     def get_queryset(self):
-        products = list(Product.objects.all())
-        products_in_stock = []
-        for product in products:
-            total = sum(item.number for item in product.size_and_number_set.all())
-            if total > 0:
-                products_in_stock.append(product)
-
-        return super().get_queryset().filter(pk__in=[p.pk for p in products_in_stock])
+        return super().get_queryset().filter(total_number__gt=0).defer("search_vector")
 
 
 class Product(DisplayMixin, models.Model):
@@ -32,18 +28,52 @@ class Product(DisplayMixin, models.Model):
     photo = models.ImageField(
         upload_to="products/%Y/%m/%d/", blank=True, null=True, verbose_name="Фотография"
     )
-    created_at = models.DateTimeField(
-        auto_now_add=True, db_index=True, verbose_name="Время появления"
-    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Время появления")
     category = models.ForeignKey(
         to="Category", on_delete=models.PROTECT, verbose_name="Категория"
     )
     subcategory = models.ForeignKey(
         to="Subcategory", on_delete=models.PROTECT, verbose_name="Подкатегория"
     )
+    total_number = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False, verbose_name="Общее количество"
+    )
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            GinIndex(
+                fields=["name"],
+                name="product_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            models.Index(
+                fields=["-created_at", "-id"], name="product_created_at_id_idx"
+            ),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="product_category_created_idx",
+                condition=Q(total_number__gt=0),
+            ),
+            models.Index(
+                fields=["category", "price", "id"],
+                name="product_category_price_idx",
+                condition=Q(total_number__gt=0),
+            ),
+            models.Index(
+                fields=["category", "subcategory", "-created_at", "-id"],
+                name="product_subcat_created_idx",
+                condition=Q(total_number__gt=0),
+            ),
+            models.Index(
+                fields=["category", "subcategory", "price", "id"],
+                name="product_subcat_price_idx",
+                condition=Q(total_number__gt=0),
+            ),
+        ]
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
 
@@ -100,6 +130,13 @@ class SizeAndNumber(models.Model):
 
     class Meta:
         ordering = ["size"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "size"],
+                name="unique_product_size",
+                nulls_distinct=False,
+            ),
+        ]
         verbose_name = "Размер и количество"
         verbose_name_plural = "Размеры и количество"
 
@@ -0,0 +1,53 @@
+import threading
+from functools import partial
+from typing import Optional
+
+from commerce.models import Category
+from django.core.cache import cache
+from django.db import transaction
+
+from online_shop.caching import bump_namespace_version
+from online_shop.caching import get_namespace_version
+from online_shop.caching import make_key
+from online_shop.settings import NAVIGATION_NAMESPACE
+
+
+def _build_categories() -> list[dict[str, str]]:
+    return [
+        {
+            "name": category.name,
+            "slug": category.slug,
+            "url": category.get_absolute_url(),
+        }
+        for category in Category.objects.order_by("pk")
+    ]
+
+
+class CategoryNavigation:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._categories: list[dict[str, str]] = []
+        self._version: Optional[int] = None
+
+    def get_categories(self) -> list[dict[str, str]]:
+        version = get_namespace_version(NAVIGATION_NAMESPACE)
+        with self._lock:
+            if version == self._version:
+                return self._categories
+
+        key = make_key(NAVIGATION_NAMESPACE, "categories")
+        categories = cache.get(key)
+        if categories is None:
+            categories = _build_categories()
+            cache.set(key, categories, timeout=None)
+        with self._lock:
+            self._categories = categories
+            self._version = version
+        return categories
+
+    @staticmethod
+    def register_change() -> None:
+        transaction.on_commit(partial(bump_namespace_version, NAVIGATION_NAMESPACE))
+
+
+category_navigation = CategoryNavigation()
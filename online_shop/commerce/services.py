@@ -1,14 +1,97 @@
+import re
+from datetime import datetime
+from functools import partial
+from typing import Iterable
+from typing import Optional
+
 from cart.models import ProductInCart
+from cart.store import cart_store
+from commerce.autocomplete import product_name_changes
+from commerce.feeds import newest_products_feed
 from commerce.models import Category
 from commerce.models import FavoriteProduct
 from commerce.models import Product
+from commerce.models import SizeAndNumber
 from commerce.models import Subcategory
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models import OuterRef
+from django.db.models import Prefetch
+from django.db.models import QuerySet
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models.functions import Cast
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Greatest
+from django.http import Http404
 from django.http import HttpRequest
+from django.urls import reverse
+from django.utils import timezone
+
+from online_shop.caching import bump_namespace_version
+from online_shop.caching import ChangeLog
+from online_shop.caching import get_namespace_version
+from online_shop.caching import make_key
+from online_shop.settings import CACHE_VERSION
+from online_shop.settings import CATALOG_CHANGED_KEY
+from online_shop.settings import CATALOG_LAST_MODIFIED_KEY
+from online_shop.settings import CATALOG_NAMESPACE
+from online_shop.settings import PRODUCT_LAST_MODIFIED_KEY
+from online_shop.settings import PRODUCT_PAGE_CHANGE_TIMEOUT
+from online_shop.settings import PRODUCT_PAGE_MAX_CHANGES
+from online_shop.settings import REPLICA_LAG_TIMEOUT
+from online_shop.settings import WISHLIST_KEY
+from online_shop.settings import WISHLIST_TIMEOUT
+
+LISTING_SORTS = (None, "price_asc", "price_desc", "date")
+MAX_CURSOR_LENGTH = 200
+
+product_page_changes = ChangeLog(
+    "product_page_changes",
+    timeout=PRODUCT_PAGE_CHANGE_TIMEOUT,
+    max_changes=PRODUCT_PAGE_MAX_CHANGES,
+)
+
+PRODUCT_SEARCH_VECTOR = SearchVector(
+    "name", weight="A", config="russian"
+) + SearchVector("description", weight="B", config="russian")
 
 
 def _get_newest_products() -> list[Product]:
-    return Product.in_stock.all()[:21]
+    return newest_products_feed.get_products()
+
+
+def _get_products_with_details(user: get_user_model()) -> QuerySet[Product]:
+    products = Product.objects.prefetch_related("size_and_number_set")
+    if user.is_authenticated:
+        products = products.annotate(
+            is_favorite=Exists(
+                FavoriteProduct.objects.filter(product_id=OuterRef("pk"), user=user)
+            )
+        ).prefetch_related(
+            Prefetch(
+                "productincart_set",
+                queryset=ProductInCart.objects.filter(user=user),
+                to_attr="products_in_cart",
+            )
+        )
+    return products
+
+
+async def _aget_product_with_details(slug: str, user: get_user_model()) -> Product:
+    try:
+        return await _get_products_with_details(user).aget(slug=slug)
+    except Product.DoesNotExist:
+        raise Http404("Товар не найден")
 
 
 def _is_size(product: Product) -> int:
@@ -17,41 +100,51 @@ def _is_size(product: Product) -> int:
     return 1
 
 
-def _is_favorite(product: Product, user: get_user_model()) -> int:
-    if not user.is_anonymous:
-        if product in [p.product for p in user.favoriteproduct_set.all()]:
-            return 1
-    return 0
+def _is_favorite(product: Product) -> int:
+    return int(getattr(product, "is_favorite", False))
 
 
 def _in_cart_and_not_all_sizes_in_cart(
-    is_size: int, product: Product, user: get_user_model()
+    is_size: int, product: Product
 ) -> tuple[int, int]:
-    in_cart = 0
+    products_in_cart = getattr(product, "products_in_cart", [])
     if not is_size:
-        not_all_sizes_in_cart = 1
-        try:
-            ProductInCart.objects.get(product_id=product.pk, user_id=user.pk)
-            in_cart = 1
-        except ProductInCart.DoesNotExist:
-            pass
-    else:
-        not_all_sizes_in_cart = 0
-        for item in product.size_and_number_set.all():
-            if item.number > 0:
-                try:
-                    ProductInCart.objects.get(
-                        product_id=item.product_id, user_id=user.id, size=item.size
-                    )
-                except ProductInCart.DoesNotExist:
-                    not_all_sizes_in_cart = 1
-                    break
+        return int(bool(products_in_cart)), 1
 
-    return in_cart, not_all_sizes_in_cart
+    sizes_in_cart = {p.size for p in products_in_cart}
+    not_all_sizes_in_cart = int(
+        any(
+            item.size not in sizes_in_cart
+            for item in product.size_and_number_set.all()
+            if item.number > 0
+        )
+    )
+    return 0, not_all_sizes_in_cart
+
+
+def _annotate_user_flags(
+    products: list[Product], user: get_user_model()
+) -> list[Product]:
+    if not user.is_authenticated or not products:
+        return products
+
+    favorite_ids = _get_wishlist_product_ids(user.pk)
+    in_cart_ids = {line.product_id for line in cart_store.get_lines(user.pk)}
+    sized_ids = set(
+        SizeAndNumber.objects.filter(product_id__in=[p.pk for p in products])
+        .exclude(size="")
+        .values_list("product_id", flat=True)
+        .distinct()
+    )
+    for product in products:
+        product.is_favorite = product.pk in favorite_ids
+        product.in_cart = product.pk in in_cart_ids
+        product.has_sizes = product.pk in sized_ids
+    return products
 
 
 def _get_products_by_category(category_slug: str) -> list[Product]:
-    return Product.in_stock.filter(category__slug=category_slug)
+    return Product.in_stock.filter(category=_get_category_id(category_slug))
 
 
 def _get_category_by_slug(slug: str) -> Category:
@@ -66,10 +159,19 @@ def _get_products_by_category_and_subcategory(
     category_slug: str, subcategory_slug: str
 ) -> list[Product]:
     return Product.in_stock.filter(
-        category__slug=category_slug, subcategory__slug=subcategory_slug
+        category=_get_category_id(category_slug),
+        subcategory=_get_subcategory_id(subcategory_slug),
     )
 
 
+def _get_category_id(slug: str) -> Subquery:
+    return Subquery(Category.objects.filter(slug=slug).values("pk"))
+
+
+def _get_subcategory_id(slug: str) -> Subquery:
+    return Subquery(Subcategory.objects.filter(slug=slug).values("pk"))
+
+
 def _get_title_by_category_and_subcategory(
     category_slug: str, subcategory_slug: str
 ) -> str:
@@ -83,8 +185,35 @@ def _get_subcategory_by_slug(slug: str) -> Subcategory:
     return Subcategory.objects.get(slug=slug)
 
 
-def _get_products_when_searching(query: str) -> list[Product]:
-    return Product.in_stock.filter(name__istartswith=query)
+def _get_search_query(query: str) -> Optional[SearchQuery]:
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return None
+    return SearchQuery(
+        " & ".join(f"{word}:*" for word in words),
+        config="russian",
+        search_type="raw",
+    )
+
+
+def _get_products_when_searching(query: Optional[str]) -> QuerySet[Product]:
+    search_query = _get_search_query(query or "")
+    if search_query is None:
+        return Product.in_stock.none()
+
+    products = (
+        Product.in_stock.filter(search_vector=search_query)
+        .annotate(rank=Cast(SearchRank(F("search_vector"), search_query), FloatField()))
+        .order_by("-rank", "-created_at")
+    )
+    if products.exists():
+        return products
+
+    return (
+        Product.in_stock.filter(name__trigram_word_similar=query)
+        .annotate(rank=Cast(TrigramWordSimilarity(query, "name"), FloatField()))
+        .order_by("-rank", "-created_at")
+    )
 
 
 def _create_product_in_wishlist(product_id: str, user_id: str) -> FavoriteProduct:
@@ -102,10 +231,213 @@ def _remove_product_from_wishlist(product_id: str, user_id: str) -> FavoriteProd
     return removed_product
 
 
-def _get_products_in_wishlist(user: get_user_model()) -> list[Product]:
-    favorite_products_ids = [p.product_id for p in user.favoriteproduct_set.all()]
-    return Product.in_stock.filter(pk__in=favorite_products_ids)
+def _get_products_in_wishlist(user: get_user_model()) -> QuerySet[Product]:
+    return Product.in_stock.filter(
+        Exists(FavoriteProduct.objects.filter(user=user, product_id=OuterRef("pk")))
+    )
+
+
+def _add_products_to_wishlist(product_ids: Iterable[int], user_id: int) -> None:
+    FavoriteProduct.objects.bulk_create(
+        [
+            FavoriteProduct(product_id=product_id, user_id=user_id)
+            for product_id in Product.objects.filter(pk__in=product_ids).values_list(
+                "pk", flat=True
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    _invalidate_wishlist_on_commit(user_id)
+
+
+def _remove_products_from_wishlist(product_ids: Iterable[int], user_id: int) -> int:
+    removed, _ = FavoriteProduct.objects.filter(
+        user_id=user_id, product_id__in=product_ids
+    ).delete()
+    _invalidate_wishlist_on_commit(user_id)
+    return removed
+
+
+def _get_wishlist_product_ids(user_id: int) -> set[int]:
+    key = WISHLIST_KEY.format(user_id=user_id)
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product_ids = set(
+            FavoriteProduct.objects.filter(user_id=user_id).values_list(
+                "product_id", flat=True
+            )
+        )
+        cache.set(key, product_ids, timeout=WISHLIST_TIMEOUT)
+    return product_ids
+
+
+def _invalidate_wishlist(user_id: int) -> None:
+    cache.delete(WISHLIST_KEY.format(user_id=user_id))
+
+
+def _invalidate_wishlist_on_commit(user_id: int) -> None:
+    transaction.on_commit(partial(_invalidate_wishlist, user_id))
+
+
+def _get_product_ids_from_request(request: HttpRequest) -> list[int]:
+    return [
+        int(product_id)
+        for product_id in request.POST.getlist("product_id")
+        if product_id.isdigit()
+    ]
 
 
 def _get_current_sort(request: HttpRequest) -> str:
     return request.GET.get("sort", None)
+
+
+def _get_listing_cache_key(
+    request: HttpRequest, category_slug: str, subcategory_slug: Optional[str] = None
+) -> Optional[str]:
+    sort = _get_current_sort(request=request)
+    page = request.GET.get("page", "")
+    cursor = request.GET.get("cursor", "")
+    if (
+        sort not in LISTING_SORTS
+        or not (page.isdigit() or not page)
+        or len(cursor) > MAX_CURSOR_LENGTH
+    ):
+        return None
+    return make_key(
+        CATALOG_NAMESPACE,
+        "listing",
+        category_slug,
+        subcategory_slug or "",
+        sort or "",
+        page,
+        cursor,
+        alias="fragments",
+    )
+
+
+def _bump_catalog_version() -> None:
+    bump_namespace_version(CATALOG_NAMESPACE, alias="fragments")
+    caches["fragments"].set(CATALOG_LAST_MODIFIED_KEY, timezone.now(), timeout=None)
+    caches["fragments"].set(CATALOG_CHANGED_KEY, True, timeout=REPLICA_LAG_TIMEOUT)
+
+
+def _bump_catalog_version_on_commit() -> None:
+    transaction.on_commit(_bump_catalog_version)
+
+
+def _invalidate_catalog() -> None:
+    _bump_catalog_version()
+    newest_products_feed.invalidate()
+    product_name_changes.invalidate()
+    product_page_changes.invalidate()
+
+
+def _get_listing_urls(
+    category_slug: str, subcategory_slug: Optional[str] = None
+) -> list[str]:
+    if subcategory_slug is None:
+        path = reverse("products_by_category", kwargs={"category_slug": category_slug})
+    else:
+        path = reverse(
+            "products_by_subcategory",
+            kwargs={
+                "category_slug": category_slug,
+                "subcategory_slug": subcategory_slug,
+            },
+        )
+    return [f"{path}?sort={sort}" if sort else path for sort in LISTING_SORTS]
+
+
+def _get_product_cache_urls(product_ids: Iterable[int]) -> list[str]:
+    urls = [reverse("home")]
+    products = Product.objects.filter(pk__in=product_ids).values_list(
+        "slug", "category__slug", "subcategory__slug"
+    )
+    for product_slug, category_slug, subcategory_slug in products:
+        urls.append(reverse("product", kwargs={"product_slug": product_slug}))
+        urls += _get_listing_urls(category_slug)
+        urls += _get_listing_urls(category_slug, subcategory_slug)
+    return list(dict.fromkeys(urls))
+
+
+def _get_catalog_cache_urls() -> list[str]:
+    urls = [reverse("home")]
+    listings = (
+        Product.in_stock.order_by()
+        .values_list("category__slug", "subcategory__slug")
+        .distinct()
+    )
+    for category_slug, subcategory_slug in listings:
+        urls += _get_listing_urls(category_slug)
+        urls += _get_listing_urls(category_slug, subcategory_slug)
+    return list(dict.fromkeys(urls))
+
+
+def _get_catalog_validators(
+    product_slug: Optional[str] = None,
+) -> tuple[str, datetime]:
+    version = get_namespace_version(CATALOG_NAMESPACE, alias="fragments")
+    last_modified = caches["fragments"].get(CATALOG_LAST_MODIFIED_KEY)
+    if last_modified is None:
+        last_modified = timezone.now()
+        caches["fragments"].add(CATALOG_LAST_MODIFIED_KEY, last_modified, timeout=None)
+    etag = f"{CACHE_VERSION}-{version}"
+
+    if product_slug is not None:
+        product_modified = caches["fragments"].get(
+            PRODUCT_LAST_MODIFIED_KEY.format(product_slug=product_slug)
+        )
+        if product_modified is not None:
+            etag = f"{etag}-{int(product_modified.timestamp() * 1_000_000)}"
+            last_modified = max(last_modified, product_modified)
+    return f'"{etag}"', last_modified
+
+
+def _mark_product_modified(product_id: int) -> None:
+    product_page_changes.add_change(product_id)
+    slug = Product.objects.filter(pk=product_id).values_list("slug", flat=True).first()
+    if slug is not None:
+        caches["fragments"].set(
+            PRODUCT_LAST_MODIFIED_KEY.format(product_slug=slug),
+            timezone.now(),
+            timeout=None,
+        )
+
+
+def _mark_product_modified_on_commit(product_id: int) -> None:
+    transaction.on_commit(partial(_mark_product_modified, product_id))
+
+
+def _update_total_number(product_ids: Optional[list[int]] = None) -> int:
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+
+    total_number = (
+        SizeAndNumber.objects.filter(product_id=OuterRef("pk"))
+        .values("product_id")
+        .annotate(total=Sum("number"))
+        .values("total")
+    )
+    return products.update(total_number=Coalesce(Subquery(total_number), 0))
+
+
+def _change_total_number(product_id: int, difference: int) -> None:
+    _mark_product_modified_on_commit(product_id)
+    products = Product.objects.filter(pk=product_id)
+    if products.filter(total_number__gt=max(-difference, 0)).update(
+        total_number=F("total_number") + difference
+    ):
+        return
+
+    products.update(total_number=Greatest(F("total_number") + difference, 0))
+    product_name_changes.register_change(product_id)
+    newest_products_feed.register_change(product_id)
+    _bump_catalog_version_on_commit()
+
+
+def _update_search_vector(product_ids: Optional[list[int]] = None) -> int:
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return products.update(search_vector=PRODUCT_SEARCH_VECTOR)
@@ -0,0 +1,70 @@
+from cart.services import _invalidate_cart_summaries_on_commit
+from commerce.autocomplete import product_name_changes
+from commerce.feeds import newest_products_feed
+from commerce.models import Category
+from commerce.models import FavoriteProduct
+from commerce.models import Product
+from commerce.models import SizeAndNumber
+from commerce.models import Subcategory
+from commerce.navigation import CategoryNavigation
+from commerce.services import _bump_catalog_version_on_commit
+from commerce.services import _invalidate_wishlist_on_commit
+from commerce.services import _mark_product_modified_on_commit
+from commerce.services import _update_search_vector
+from commerce.services import _update_total_number
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=SizeAndNumber)
+@receiver(post_delete, sender=SizeAndNumber)
+def update_total_number_on_size_change(sender, instance, **kwargs):
+    _update_total_number(product_ids=[instance.product_id])
+    product_name_changes.register_change(instance.product_id)
+    _mark_product_modified_on_commit(instance.product_id)
+    newest_products_feed.register_change(instance.product_id)
+    _bump_catalog_version_on_commit()
+
+
+@receiver(post_save, sender=Product)
+def update_product_aggregates(sender, instance, raw, **kwargs):
+    _update_search_vector(product_ids=[instance.pk])
+    if raw:
+        _update_total_number(product_ids=[instance.pk])
+    product_name_changes.register_change(instance.pk)
+    _mark_product_modified_on_commit(instance.pk)
+    newest_products_feed.register_change(instance.pk)
+    _bump_catalog_version_on_commit()
+
+
+@receiver(pre_save, sender=Product)
+def invalidate_cart_summaries_on_price_change(sender, instance, raw, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if Product.objects.filter(pk=instance.pk).exclude(price=instance.price).exists():
+        _invalidate_cart_summaries_on_commit(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_name_index(sender, instance, **kwargs):
+    product_name_changes.register_change(instance.pk)
+    _mark_product_modified_on_commit(instance.pk)
+    newest_products_feed.register_change(instance.pk)
+    _bump_catalog_version_on_commit()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+def invalidate_catalog_on_category_change(sender, **kwargs):
+    CategoryNavigation.register_change()
+    _bump_catalog_version_on_commit()
+
+
+@receiver(post_save, sender=FavoriteProduct)
+@receiver(post_delete, sender=FavoriteProduct)
+def invalidate_wishlist_on_change(sender, instance, **kwargs):
+    _invalidate_wishlist_on_commit(instance.user_id)
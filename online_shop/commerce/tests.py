@@ -1,20 +1,133 @@
+import asyncio
+import re
+import threading
+import time
 from http import HTTPStatus
+from io import StringIO
 from math import ceil
+from unittest.mock import patch
 
 from cart.models import ProductInCart
+from cart.services import _add_product_to_cart
+from commerce.autocomplete import product_name_changes
+from commerce.autocomplete import product_name_index
+from commerce.factories import create_synthetic_catalog
+from commerce.feeds import newest_products_feed
 from commerce.models import Category
 from commerce.models import FavoriteProduct
 from commerce.models import Product
+from commerce.models import SizeAndNumber
 from commerce.models import Subcategory
+from commerce.navigation import category_navigation
+from commerce.services import _annotate_user_flags
+from commerce.services import _change_total_number
+from commerce.services import _get_catalog_validators
+from commerce.services import _get_listing_cache_key
+from commerce.services import _get_product_cache_urls
+from commerce.services import _get_products_when_searching
+from commerce.services import _get_wishlist_product_ids
+from commerce.services import _update_total_number
+from commerce.urls import query_budgets
+from commerce.urls import urlpatterns
 from commerce.views import FavoriteProductsView
 from commerce.views import IndexListView
 from commerce.views import ProductsByCategoryView
 from commerce.views import ProductsBySearchView
 from commerce.views import ProductsBySubcategoryView
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db import connections
+from django.db import DEFAULT_DB_ALIAS
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.http import HttpResponse
+from django.http import QueryDict
+from django.test import RequestFactory
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from online_shop.caching import aget_or_build
+from online_shop.caching import get_or_build
+from online_shop.middleware import ReplicaRoutingMiddleware
+from online_shop.routers import replica_routing
+from online_shop.routers import ReplicaRouting
+from online_shop.settings import BASE_DIR
+from online_shop.settings import CATALOG_CHANGED_KEY
+from online_shop.settings import NEWEST_PRODUCTS_LIMIT
+from online_shop.settings import NGINX_PURGE_URL
+from online_shop.settings import USE_PRIMARY_COOKIE
+from online_shop.testing import clear_caches
+from online_shop.testing import QueryBudgetMixin
+from online_shop.testing import run_in_workers
+from online_shop.testing import TEST_REPLICA
+
+
+class ProductsInStockTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def test_total_number_after_fixture_loading(self):
+        product = Product.objects.get(slug="pidzhak")
+
+        self.assertEqual(
+            product.total_number,
+            sum(item.number for item in product.size_and_number_set.all()),
+        )
+
+    def test_product_out_of_stock(self):
+        product = Product.objects.get(slug="pidzhak")
+        for item in product.size_and_number_set.all():
+            item.number = 0
+            item.save()
+
+        self.assertFalse(Product.in_stock.filter(pk=product.pk).exists())
+
+    def test_product_without_sizes(self):
+        product = Product.objects.get(slug="pidzhak")
+        for item in product.size_and_number_set.all():
+            item.delete()
+
+        self.assertEqual(Product.objects.get(pk=product.pk).total_number, 0)
+        self.assertFalse(Product.in_stock.filter(pk=product.pk).exists())
+
+    def test_product_back_in_stock(self):
+        product = Product.objects.get(slug="pidzhak")
+        product.size_and_number_set.update(number=0)
+        Product.objects.filter(pk=product.pk).update(total_number=0)
+
+        SizeAndNumber.objects.create(product=product, size="52", number=2)
+
+        self.assertEqual(Product.objects.get(pk=product.pk).total_number, 2)
+        self.assertTrue(Product.in_stock.filter(pk=product.pk).exists())
+
+    def test_rebuild_stock_counters(self):
+        Product.objects.update(total_number=0)
+        product_name_index.build()
+        etag, _ = _get_catalog_validators()
+
+        call_command("rebuild_stock_counters", stdout=StringIO())
+
+        for product in Product.objects.all():
+            self.assertEqual(
+                product.total_number,
+                sum(item.number for item in product.size_and_number_set.all()),
+            )
+        self.assertNotEqual(_get_catalog_validators()[0], etag)
+        self.assertEqual(
+            product_name_index.search("пиджак")[0]["name"],
+            Product.objects.get(slug="pidzhak").name,
+        )
+
 
 class IndexListTestCase(TestCase):
     fixtures = [
@@ -49,6 +162,83 @@ class IndexListTestCase(TestCase):
         )
 
 
+class NewestProductsFeedTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def setUp(self):
+        clear_caches()
+
+    def assertFeedIsFresh(self):
+        self.assertEqual(
+            [product.pk for product in newest_products_feed.get_products()],
+            list(
+                Product.in_stock.order_by("-created_at", "-id").values_list(
+                    "pk", flat=True
+                )[:NEWEST_PRODUCTS_LIMIT]
+            ),
+        )
+
+    def test_home_page_is_served_from_cache(self):
+        self.client.get(reverse("home"))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"))
+
+        self.assertEqual(
+            list(response.context["products"]),
+            list(Product.in_stock.all())[: IndexListView.paginate_by],
+        )
+
+    def test_contended_update_does_not_wait(self):
+        newest_products_feed.get_products()
+        newest = Product.in_stock.first()
+        caches["fragments"].add(newest_products_feed.lock_key, 1)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            newest.size_and_number_set.all().delete()
+        started = time.monotonic()
+        for callback in callbacks:
+            callback()
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        caches["fragments"].delete(newest_products_feed.lock_key)
+        self.assertFeedIsFresh()
+
+    def test_feed_follows_stock_changes(self):
+        newest_products_feed.get_products()
+        newest = Product.in_stock.first()
+        oldest = Product.in_stock.order_by("-created_at")[NEWEST_PRODUCTS_LIMIT - 1]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            newest.size_and_number_set.all().delete()
+        self.assertFeedIsFresh()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name="Кеды Converse",
+                slug="kedy-converse",
+                price=5000,
+                category=oldest.category,
+                subcategory=oldest.subcategory,
+            )
+        self.assertNotIn(product, newest_products_feed.get_products())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SizeAndNumber.objects.create(product=product, size="42", number=1)
+        self.assertEqual(newest_products_feed.get_products()[0], product)
+        self.assertFeedIsFresh()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            oldest.name = "Кеды Vans"
+            oldest.save()
+        self.assertFeedIsFresh()
+
+
 class ProductTestCase(TestCase):
     fixtures = [
         "fixtures/commerce_category.json",
@@ -164,6 +354,27 @@ class ProductTestCase(TestCase):
         self.assertTrue(context["in_cart"])
         self.assertTrue(context["not_all_sizes_in_cart"])
 
+    def test_product_queries_do_not_depend_on_sizes(self):
+        path = reverse("product", kwargs={"product_slug": "pidzhak"})
+        self.client.get(path)
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(path)
+
+        product = Product.objects.get(slug="pidzhak")
+        for size in range(52, 72, 2):
+            SizeAndNumber.objects.create(product=product, size=size, number=1)
+            ProductInCart.objects.create(
+                user_id=2, product=product, size=size, number=1
+            )
+        FavoriteProduct.objects.create(user_id=2, product=product)
+
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(path)
+
+        self.assertEqual(len(before), len(after))
+        self.assertTrue(response.context["is_favorite"])
+        self.assertTrue(response.context["not_all_sizes_in_cart"])
+
 
 class ProductsByCategoryTestCase(TestCase):
     fixtures = [
@@ -173,6 +384,9 @@ class ProductsByCategoryTestCase(TestCase):
         "fixtures/commerce_sizeandnumber.json",
     ]
 
+    def setUp(self):
+        clear_caches()
+
     def test_products_by_category(self):
         slug = "muzhchinam"
         response = self.client.get(
@@ -271,6 +485,9 @@ class ProductsBySubcategoryTestCase(TestCase):
         "fixtures/commerce_sizeandnumber.json",
     ]
 
+    def setUp(self):
+        clear_caches()
+
     def test_products_by_subcategory(self):
         cat_slug = "muzhchinam"
         subcat_slug = "obuv"
@@ -372,27 +589,72 @@ class ProductsBySearchTestCase(TestCase):
     def test_products_by_search_first_page(self):
         query = "кр"
         response = self.client.get(reverse("products_by_search") + f"?query={query}")
+        products = list(response.context["products"])
 
+        self.assertEqual(len(products), ProductsBySearchView.paginate_by)
         self.assertEqual(
-            list(response.context["products"]),
-            list(Product.in_stock.filter(name__istartswith=query))[
-                : ProductsBySearchView.paginate_by
-            ],
+            {p.pk for p in products[:4]},
+            set(
+                Product.in_stock.filter(name__icontains="кроссовки").values_list(
+                    "pk", flat=True
+                )
+            ),
         )
+        self.assertEqual({p.pk for p in products[4:]}, {1, 2})
 
     def test_products_by_search_first_page_date(self):
         query = "кр"
         response = self.client.get(
             reverse("products_by_search") + f"?query={query}&sort=date"
         )
+        products = list(response.context["products"])
 
         self.assertEqual(
-            list(response.context["products"]),
-            list(Product.in_stock.filter(name__istartswith=query))[
-                : ProductsBySearchView.paginate_by
-            ],
+            products,
+            sorted(products, key=lambda p: p.created_at, reverse=True),
+        )
+
+    def test_products_by_search_price_asc(self):
+        query = "кр"
+        response = self.client.get(
+            reverse("products_by_search") + f"?query={query}&sort=price_asc"
+        )
+        products = list(response.context["products"])
+
+        self.assertEqual(products, sorted(products, key=lambda p: p.price))
+
+    def test_products_by_search_in_description(self):
+        response = self.client.get(reverse("products_by_search") + "?query=nike")
+
+        self.assertEqual(
+            [p.slug for p in response.context["products"]],
+            ["detskie-krossovki-nike", "krossovki-nike"],
+        )
+
+    def test_products_by_search_stemming(self):
+        response = self.client.get(reverse("products_by_search") + "?query=кроссовок")
+
+        self.assertIn(
+            Product.objects.get(slug="krossovki-adidas"), response.context["products"]
+        )
+
+    def test_products_by_search_with_typo(self):
+        response = self.client.get(reverse("products_by_search") + "?query=кросовки")
+
+        self.assertIn(
+            Product.objects.get(slug="krossovki-nike"), response.context["products"]
         )
 
+    def test_products_by_search_without_results(self):
+        for query in ("", "!!!", "zzzzzz"):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse("products_by_search") + f"?query={query}"
+                )
+
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(list(response.context["products"]), [])
+
 
 class AddToWishlistTestCase(TestCase):
     fixtures = [
@@ -532,3 +794,969 @@ class FavoriteProductsTestCase(TestCase):
             reverse("message_about_wishlist")
             + "?next=/commerce/wishlist/list-of-favorite/",
         )
+
+
+class WishlistTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+        "fixtures/users_user.json",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.get(pk=2)
+        self.client.force_login(self.user)
+
+    def get_favorite_ids(self):
+        return set(
+            FavoriteProduct.objects.filter(user=self.user).values_list(
+                "product_id", flat=True
+            )
+        )
+
+    def test_add_products_to_wishlist(self):
+        FavoriteProduct.objects.create(user=self.user, product_id=59)
+
+        response = self.client.post(
+            reverse("add_products_to_wishlist"),
+            {"product_id": [1, 4, 59, 1000000, "abc"]},
+        )
+
+        self.assertRedirects(response, reverse("list_of_favorite"))
+        self.assertEqual(self.get_favorite_ids(), {1, 4, 59})
+
+    def test_remove_products_from_wishlist(self):
+        FavoriteProduct.objects.bulk_create(
+            [
+                FavoriteProduct(user=self.user, product_id=product_id)
+                for product_id in (1, 4, 59)
+            ]
+        )
+        other_user = get_user_model().objects.create(email="other@mail.ru")
+        FavoriteProduct.objects.create(user=other_user, product_id=1)
+
+        response = self.client.post(
+            reverse("remove_products_from_wishlist"), {"product_id": [1, 59]}
+        )
+
+        self.assertRedirects(response, reverse("list_of_favorite"))
+        self.assertEqual(self.get_favorite_ids(), {4})
+        self.assertTrue(FavoriteProduct.objects.filter(user=other_user).exists())
+
+    def test_bulk_wishlist_views_require_login(self):
+        self.client.logout()
+
+        for url_name in ("add_products_to_wishlist", "remove_products_from_wishlist"):
+            with self.subTest(url_name=url_name):
+                response = self.client.post(reverse(url_name), {"product_id": [1]})
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+                self.assertTrue(
+                    response.url.startswith(reverse("message_about_wishlist"))
+                )
+        self.assertFalse(FavoriteProduct.objects.exists())
+
+    def test_wishlist_product_ids_are_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(_get_wishlist_product_ids(self.user.pk), set())
+        with self.assertNumQueries(0):
+            self.assertEqual(_get_wishlist_product_ids(self.user.pk), set())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("add_products_to_wishlist"), {"product_id": [1, 59]}
+            )
+        self.assertEqual(_get_wishlist_product_ids(self.user.pk), {1, 59})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse(
+                    "remove_from_wishlist",
+                    kwargs={"product_id": 59, "user_id": self.user.pk},
+                )
+            )
+        self.assertEqual(_get_wishlist_product_ids(self.user.pk), {1})
+
+
+class ProductBadgesTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+        "fixtures/users_user.json",
+    ]
+
+    def setUp(self):
+        clear_caches()
+        self.user = get_user_model().objects.get(pk=2)
+        self.client.force_login(self.user)
+
+    def test_annotate_user_flags(self):
+        FavoriteProduct.objects.create(user=self.user, product_id=59)
+        ProductInCart.objects.create(user=self.user, product_id=4, size=48, number=1)
+        products = list(Product.objects.filter(pk__in=[1, 4, 59]).order_by("pk"))
+
+        with self.assertNumQueries(3):
+            _annotate_user_flags(products, self.user)
+
+        self.assertEqual(
+            [(p.is_favorite, p.in_cart, p.has_sizes) for p in products],
+            [(False, False, True), (False, True, True), (True, False, False)],
+        )
+        with self.assertNumQueries(1):
+            _annotate_user_flags(products, self.user)
+
+    def test_cached_listing_badges_are_per_user(self):
+        path = reverse("products_by_category", kwargs={"category_slug": "muzhchinam"})
+        product_id = self.client.get(path).context["product_ids"][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse(
+                    "add_to_wishlist",
+                    kwargs={"product_id": product_id, "user_id": self.user.pk},
+                )
+            )
+
+        response = self.client.get(path)
+        self.assertContains(response, '<span class="badge badge-danger"', count=1)
+        self.assertContains(response, '<div class="container-fluid">')
+        self.assertNotContains(response, "&lt;div")
+
+        self.client.logout()
+        response = self.client.get(path)
+        self.assertNotContains(response, "badge-danger")
+        self.assertContains(response, '<div class="container-fluid">')
+
+    def test_badges_cost_does_not_depend_on_page(self):
+        path = reverse("home")
+        product_ids = [p.pk for p in self.client.get(path).context["products"]]
+
+        query_counts = []
+        for number_of_products in (1, len(product_ids)):
+            FavoriteProduct.objects.all().delete()
+            ProductInCart.objects.all().delete()
+            FavoriteProduct.objects.bulk_create(
+                [
+                    FavoriteProduct(user=self.user, product_id=product_id)
+                    for product_id in product_ids[:number_of_products]
+                ]
+            )
+            ProductInCart.objects.bulk_create(
+                [
+                    ProductInCart(user=self.user, product_id=product_id, number=1)
+                    for product_id in product_ids[:number_of_products]
+                ]
+            )
+            clear_caches()
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(path)
+            self.assertContains(response, "badge-danger", count=number_of_products)
+            query_counts.append(len(context.captured_queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+class AutocompleteTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def setUp(self):
+        product_name_index.clear()
+        self.addCleanup(product_name_index.clear)
+
+    def get_names(self, query):
+        response = self.client.get(reverse("autocomplete"), {"query": query})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [product["name"] for product in response.json()["results"]]
+
+    def test_autocomplete_by_prefix(self):
+        names = self.get_names("Кр")
+
+        self.assertTrue(names)
+        for name in names:
+            self.assertTrue(any(word.startswith("кр") for word in name.lower().split()))
+
+    def test_autocomplete_by_word_in_the_middle(self):
+        product = Product.in_stock.get(slug="krossovki-nike")
+        word = product.name.split()[-1]
+
+        self.assertIn(product.name, self.get_names(word[:3]))
+
+    def test_autocomplete_returns_product_urls(self):
+        product = Product.in_stock.get(slug="krossovki-nike")
+        response = self.client.get(reverse("autocomplete"), {"query": product.name})
+
+        self.assertIn(
+            {"name": product.name, "url": product.get_absolute_url()},
+            response.json()["results"],
+        )
+
+    def test_autocomplete_without_results(self):
+        for query in ("", "!!!", "zzzzzz"):
+            with self.subTest(query=query):
+                self.assertEqual(self.get_names(query), [])
+
+    def test_autocomplete_excludes_products_out_of_stock(self):
+        product = Product.objects.get(slug="krossovki-nike")
+        SizeAndNumber.objects.filter(product=product).delete()
+
+        self.assertNotIn(product.name, self.get_names(product.name))
+
+    def test_autocomplete_follows_product_changes(self):
+        product = Product.in_stock.get(slug="krossovki-nike")
+        self.assertIn(product.name, self.get_names(product.name))
+
+        product.name = "Кеды Converse"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertIn("Кеды Converse", self.get_names("кеды"))
+        self.assertNotIn("Кроссовки Nike", self.get_names("кроссовки nike"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SizeAndNumber.objects.filter(product=product).delete()
+        self.assertEqual(self.get_names("кеды"), [])
+
+    def test_changes_are_registered_after_commit(self):
+        version = product_name_changes.get_version()
+        product = Product.in_stock.get(slug="krossovki-nike")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.name = "Кеды Converse"
+            product.save()
+        self.assertEqual(product_name_changes.get_version(), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertGreater(product_name_changes.get_version(), version)
+
+    def test_stock_changes_keep_index_version(self):
+        product = Product.in_stock.get(slug="krossovki-nike")
+        version = product_name_changes.get_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _change_total_number(product.pk, 1)
+            _change_total_number(product.pk, -1)
+        self.assertEqual(product_name_changes.get_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _change_total_number(product.pk, -product.total_number)
+        self.assertGreater(product_name_changes.get_version(), version)
+
+    def test_autocomplete_without_queries_when_warm(self):
+        self.get_names("кр")
+
+        with self.assertNumQueries(0):
+            self.get_names("кроссовки")
+
+
+class ListingCacheTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def setUp(self):
+        clear_caches()
+
+    def test_listing_is_cached(self):
+        path = reverse("products_by_category", kwargs={"category_slug": "muzhchinam"})
+        with CaptureQueriesContext(connection) as cold:
+            cold_response = self.client.get(path, {"sort": "price_asc"})
+        with CaptureQueriesContext(connection) as warm:
+            warm_response = self.client.get(path, {"sort": "price_asc"})
+
+        self.assertLess(len(warm), len(cold))
+        self.assertEqual(warm_response.content, cold_response.content)
+        self.assertEqual(
+            warm_response.context["cat_selected"],
+            Category.objects.get(slug="muzhchinam"),
+        )
+
+    def test_listing_cache_key(self):
+        factory = RequestFactory()
+        keys = {
+            _get_listing_cache_key(factory.get("/", data), "muzhchinam", "obuv")
+            for data in ({}, {"sort": "date"}, {"sort": "date", "page": 2})
+        }
+
+        self.assertEqual(len(keys), 3)
+        self.assertIsNone(
+            _get_listing_cache_key(factory.get("/", {"sort": "name"}), "muzhchinam")
+        )
+        self.assertIsNone(
+            _get_listing_cache_key(factory.get("/", {"page": "last"}), "muzhchinam")
+        )
+
+    def test_listing_follows_product_changes(self):
+        path = reverse(
+            "products_by_subcategory",
+            kwargs={"category_slug": "muzhchinam", "subcategory_slug": "obuv"},
+        )
+        product = Product.in_stock.filter(
+            category__slug="muzhchinam", subcategory__slug="obuv"
+        ).first()
+        self.client.get(path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Кеды Converse"
+            product.save()
+
+        self.assertContains(self.client.get(path), "Кеды Converse")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.size_and_number_set.all().delete()
+
+        self.assertNotContains(self.client.get(path), "Кеды Converse")
+
+    def test_only_one_worker_rebuilds_listing(self):
+        key = _get_listing_cache_key(RequestFactory().get("/"), "muzhchinam")
+        builds = []
+        results = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return "listing"
+
+        def worker():
+            results.append(get_or_build(key, build, alias="fragments"))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, ["listing"] * 8)
+
+    async def test_only_one_coroutine_rebuilds_listing(self):
+        key = _get_listing_cache_key(RequestFactory().get("/"), "muzhchinam")
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return "listing"
+
+        results = await asyncio.gather(
+            *(aget_or_build(key, build, alias="fragments") for _ in range(8))
+        )
+
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, ["listing"] * 8)
+
+    async def test_async_views(self):
+        product = await Product.in_stock.afirst()
+        for path, data in (
+            (reverse("home"), {}),
+            (product.get_absolute_url(), {}),
+            (reverse("autocomplete"), {"query": product.name[:3]}),
+        ):
+            response = await self.async_client.get(path, data)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertEqual(response["Cache-Control"], "public, max-age=60")
+
+
+class CursorPaginationTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def setUp(self):
+        clear_caches()
+        create_synthetic_catalog(40)
+
+    def walk(self, path, data, key="next"):
+        pages = []
+        response = self.client.get(path, data)
+        while True:
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            page = response.context["page_obj"]
+            pages.append(list(response.context["products"]))
+            if not getattr(page, f"has_{key}")():
+                return pages, page
+            response = self.client.get(f"{path}?{getattr(page, f'{key}_query')}")
+
+    def test_cursor_pages_cover_listing(self):
+        path = reverse("products_by_category", kwargs={"category_slug": "synthetic"})
+        products = Product.in_stock.filter(category__slug="synthetic")
+        orderings = {
+            None: ("-created_at", "-pk"),
+            "price_asc": ("price", "pk"),
+            "price_desc": ("-price", "-pk"),
+        }
+        for sort, ordering in orderings.items():
+            with self.subTest(sort=sort):
+                data = {"sort": sort} if sort else {}
+                pages, last_page = self.walk(path, data)
+
+                self.assertTrue(
+                    all(
+                        len(page) == ProductsByCategoryView.paginate_by
+                        for page in pages[:-1]
+                    )
+                )
+                self.assertEqual(
+                    [product for page in pages for product in page],
+                    list(products.order_by(*ordering)),
+                )
+                self.assertTrue(last_page.has_previous())
+                if sort:
+                    self.assertIn(f"sort={sort}", last_page.previous_query)
+
+    def test_cursor_links_keep_only_listing_params(self):
+        path = reverse("products_by_category", kwargs={"category_slug": "synthetic"})
+        response = self.client.get(path, {"sort": "price_asc", "utm_source": "mail"})
+        next_query = QueryDict(response.context["page_obj"].next_query)
+        self.assertEqual(set(next_query), {"sort", "cursor"})
+
+        response = self.client.get(path, {"sort": "price_asc"})
+        self.assertContains(response, "?sort=price_asc&amp;cursor=")
+        self.assertNotContains(response, "utm_source")
+
+    def test_cursor_pages_go_back(self):
+        path = reverse("products_by_category", kwargs={"category_slug": "synthetic"})
+        forward, last_page = self.walk(path, {})
+        backward, first_page = self.walk(
+            f"{path}", {"cursor": last_page.previous_cursor}, key="previous"
+        )
+
+        self.assertEqual(backward[::-1], forward[:-1])
+        self.assertFalse(first_page.has_previous())
+
+    def test_cursor_pages_cover_search_results(self):
+        create_synthetic_catalog(60)
+        path = reverse("products_by_search")
+        pages, last_page = self.walk(path, {"query": "Куртка"})
+
+        self.assertGreater(len(pages), 1)
+        self.assertEqual(
+            [product for page in pages for product in page],
+            list(
+                _get_products_when_searching("Куртка").order_by(
+                    "-rank", "-created_at", "-pk"
+                )
+            ),
+        )
+        self.assertIn("query=", last_page.previous_query)
+
+    def test_cursor_page_does_not_count(self):
+        path = reverse("products_by_category", kwargs={"category_slug": "synthetic"})
+        cursor = self.client.get(path).context["page_obj"].next_cursor
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, {"cursor": cursor})
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(
+            any("COUNT(" in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_cursor_pages_cover_newest_products(self):
+        pages, _ = self.walk(reverse("home"), {})
+
+        self.assertEqual(
+            [product for page in pages for product in page],
+            list(Product.in_stock.all()[:21]),
+        )
+
+    def test_invalid_cursor(self):
+        for cursor in ("invalid", "WyJhIl0", "WyJ4IiwgMV0"):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse("home"), {"cursor": cursor})
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class ListingIndexPlanTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        create_synthetic_catalog(5000)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        clear_caches()
+
+    def get_listing_queries(self, path, data):
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get(path, data)
+        next_query = response.context["page_obj"].next_query
+        with CaptureQueriesContext(connection) as next_page:
+            self.client.get(f"{path}?{next_query}")
+        with CaptureQueriesContext(connection) as offset_page:
+            self.client.get(path, {**data, "page": 100})
+        return [
+            query["sql"]
+            for context in (first_page, next_page, offset_page)
+            for query in context.captured_queries
+            if "commerce_product" in query["sql"]
+        ]
+
+    def test_listings_use_indexes(self):
+        paths = [
+            reverse("home"),
+            reverse("products_by_category", kwargs={"category_slug": "synthetic"}),
+            reverse(
+                "products_by_subcategory",
+                kwargs={"category_slug": "synthetic", "subcategory_slug": "synthetic"},
+            ),
+        ]
+        for path in paths:
+            for sort in (None, "price_asc", "price_desc", "date"):
+                data = {"sort": sort} if sort else {}
+                for sql in self.get_listing_queries(path, data):
+                    with self.subTest(path=path, sort=sort, sql=sql):
+                        with connection.cursor() as cursor:
+                            cursor.execute(f"EXPLAIN {sql}")
+                            plan = "\n".join(row[0] for row in cursor.fetchall())
+                        self.assertNotIn("Seq Scan on commerce_product", plan)
+
+
+class CategoryNavigationTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+    ]
+
+    def setUp(self):
+        clear_caches()
+
+    def test_navigation_is_rendered_without_queries(self):
+        self.client.get(reverse("search"))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("search"))
+
+        for category in Category.objects.all():
+            self.assertContains(response, category.get_absolute_url())
+            self.assertContains(response, category.name)
+
+    def test_navigation_follows_category_changes(self):
+        category = Category.objects.first()
+        self.client.get(reverse("search"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.name = "Распродажа"
+            category.save()
+
+        self.assertContains(self.client.get(reverse("search")), "Распродажа")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Новинки сезона", slug="novinki-sezona")
+
+        self.assertContains(
+            self.client.get(reverse("search")),
+            reverse("products_by_category", kwargs={"category_slug": "novinki-sezona"}),
+        )
+
+    def test_navigation_is_invalidated_by_other_workers(self):
+        category_navigation.get_categories()
+        with self.assertNumQueries(0):
+            category_navigation.get_categories()
+
+        run_in_workers(
+            "from commerce.navigation import CategoryNavigation\n"
+            "CategoryNavigation.register_change()"
+        )
+
+        with self.assertNumQueries(1):
+            category_navigation.get_categories()
+
+
+class HttpCachingTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+        "fixtures/users_user.json",
+    ]
+
+    def setUp(self):
+        clear_caches()
+
+    def test_catalog_is_public_for_anonymous_users(self):
+        product = Product.in_stock.first()
+        paths = [
+            reverse("home"),
+            reverse("product", kwargs={"product_slug": product.slug}),
+            reverse("products_by_category", kwargs={"category_slug": "muzhchinam"}),
+            reverse("autocomplete") + "?query=кр",
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertIn("public", response.headers["Cache-Control"])
+                self.assertIn("max-age=60", response.headers["Cache-Control"])
+                self.assertIn("ETag", response.headers)
+                self.assertIn("Last-Modified", response.headers)
+
+    def test_catalog_emits_nginx_cache_headers(self):
+        path = reverse(
+            "products_by_subcategory",
+            kwargs={"category_slug": "muzhchinam", "subcategory_slug": "obuv"},
+        )
+        response = self.client.get(path, {"sort": "price_asc"})
+
+        self.assertEqual(response.headers["X-Cache-Key"], f"{path}?sort=price_asc")
+        self.assertEqual(
+            response.headers["Surrogate-Key"],
+            "catalog category-muzhchinam subcategory-obuv",
+        )
+        self.assertEqual(response.headers["X-Accel-Expires"], "10")
+
+    def test_personalized_pages_are_not_stored(self):
+        self.client.force_login(get_user_model().objects.get(email="user1@mail.ru"))
+        for path in (
+            reverse("home"),
+            reverse("list_of_favorite"),
+            reverse("list_of_products_in_cart"),
+        ):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+
+                self.assertIn("no-store", response.headers["Cache-Control"])
+                self.assertIn("private", response.headers["Cache-Control"])
+                self.assertNotIn("ETag", response.headers)
+
+    def test_not_modified_skips_rendering(self):
+        path = reverse("products_by_category", kwargs={"category_slug": "muzhchinam"})
+        response = self.client.get(path)
+        validators = {
+            "If-None-Match": response.headers["ETag"],
+            "If-Modified-Since": response.headers["Last-Modified"],
+        }
+        for name, value in validators.items():
+            with self.subTest(header=name):
+                with self.assertNumQueries(0):
+                    response = self.client.get(path, headers={name: value})
+
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response.templates, [])
+                self.assertEqual(response.content, b"")
+
+    def test_catalog_change_changes_etag(self):
+        path = reverse("home")
+        etag = self.client.get(path).headers["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SizeAndNumber.objects.filter(product=Product.in_stock.first()).delete()
+
+        response = self.client.get(path, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_sold_out_size_changes_product_etag(self):
+        size_and_number = (
+            SizeAndNumber.objects.filter(number__gt=0)
+            .exclude(size="")
+            .filter(
+                Exists(
+                    SizeAndNumber.objects.filter(
+                        product_id=OuterRef("product_id"), number__gt=0
+                    ).exclude(pk=OuterRef("pk"))
+                )
+            )
+            .first()
+        )
+        SizeAndNumber.objects.filter(pk=size_and_number.pk).update(number=1)
+        _update_total_number(product_ids=[size_and_number.product_id])
+        path = size_and_number.product.get_absolute_url()
+        response = self.client.get(path)
+        etag = response.headers["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(
+                _add_product_to_cart(
+                    str(size_and_number.product_id), "2", size_and_number.size
+                )
+            )
+
+        response = self.client.get(path, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(
+            self.client.get(
+                path, headers={"If-None-Match": response.headers["ETag"]}
+            ).status_code,
+            HTTPStatus.NOT_MODIFIED,
+        )
+
+
+class CachePurgeTestCase(TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+    ]
+
+    def setUp(self):
+        clear_caches()
+
+    def purge(self, *args):
+        with patch(
+            "commerce.management.commands.purge_catalog_cache.urlopen"
+        ) as urlopen:
+            call_command("purge_catalog_cache", *args, stdout=StringIO())
+        return [call.args[0] for call in urlopen.call_args_list]
+
+    def test_purge_product_urls(self):
+        product = Product.objects.select_related("category", "subcategory").first()
+        requests = self.purge(str(product.pk))
+        urls = [request.full_url for request in requests]
+        category_url = product.category.get_absolute_url()
+
+        self.assertIn(f"{NGINX_PURGE_URL}{reverse('home')}", urls)
+        self.assertIn(f"{NGINX_PURGE_URL}{product.get_absolute_url()}", urls)
+        self.assertIn(f"{NGINX_PURGE_URL}{category_url}?sort=price_desc", urls)
+        self.assertEqual(len(urls), len(set(urls)))
+        self.assertTrue(all(url.startswith(f"{NGINX_PURGE_URL}/") for url in urls))
+
+    def test_purge_refreshes_public_cache_key(self):
+        config = (BASE_DIR / "docker" / "nginx" / "nginx.conf").read_text()
+        cache_keys = re.findall(r"proxy_cache_key (.+);", config)
+
+        self.assertEqual(len(cache_keys), 2)
+        self.assertEqual(set(cache_keys), {"$request_uri"})
+        self.assertNotIn("8081", (BASE_DIR.parent / "docker-compose.yml").read_text())
+
+    def test_purge_follows_product_changes(self):
+        self.purge()
+        self.assertEqual(self.purge(), [])
+
+        product = Product.objects.first()
+        product.name = "Кеды Converse"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        urls = [request.full_url for request in self.purge()]
+
+        self.assertIn(f"{NGINX_PURGE_URL}{product.get_absolute_url()}", urls)
+        self.assertEqual(len(urls), len(_get_product_cache_urls([product.pk])))
+
+    def test_purge_follows_stock_changes(self):
+        self.purge()
+        product = Product.in_stock.filter(total_number__gt=1).first()
+        catalog_etag = _get_catalog_validators()[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _change_total_number(product.pk, -1)
+        urls = [request.full_url for request in self.purge()]
+
+        self.assertIn(f"{NGINX_PURGE_URL}{product.get_absolute_url()}", urls)
+        self.assertNotEqual(
+            _get_catalog_validators(product.slug)[0],
+            _get_catalog_validators()[0],
+        )
+        self.assertEqual(_get_catalog_validators()[0], catalog_etag)
+
+
+class ReplicaRoutingTestCase(TransactionTestCase):
+    databases = {DEFAULT_DB_ALIAS, TEST_REPLICA}
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+        "fixtures/users_user.json",
+    ]
+
+    def setUp(self):
+        clear_caches()
+        for module in ("online_shop.routers", "online_shop.middleware"):
+            patcher = patch(f"{module}.DATABASE_REPLICAS", [TEST_REPLICA])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_product_queries(self, path: str, data=None) -> tuple[list, list]:
+        with CaptureQueriesContext(
+            connections[DEFAULT_DB_ALIAS]
+        ) as primary, CaptureQueriesContext(connections[TEST_REPLICA]) as replica:
+            self.client.get(path, data)
+        return [
+            [query for query in context if '"commerce_product"' in query["sql"]]
+            for context in (primary, replica)
+        ]
+
+    def test_catalog_reads_go_to_replica(self):
+        product = Product.in_stock.first()
+        for path in (
+            reverse("products_by_category", kwargs={"category_slug": "muzhchinam"}),
+            reverse("product", kwargs={"product_slug": product.slug}),
+        ):
+            with self.subTest(path=path):
+                primary, replica = self.get_product_queries(path)
+
+                self.assertEqual(primary, [])
+                self.assertNotEqual(replica, [])
+
+    def test_write_sticks_to_primary(self):
+        self.client.force_login(get_user_model().objects.get(pk=2))
+        product = Product.objects.get(pk=59)
+
+        response = self.client.get(
+            reverse("add_to_cart"), {"user_id": 2, "product_id": 59, "is_size": 0}
+        )
+        self.assertIn(USE_PRIMARY_COOKIE, response.cookies)
+
+        primary, replica = self.get_product_queries(
+            reverse("product", kwargs={"product_slug": product.slug})
+        )
+        self.assertNotEqual(primary, [])
+        self.assertEqual(replica, [])
+
+    def test_catalog_change_reads_from_primary(self):
+        product = Product.in_stock.first()
+        product.name = "Кеды Converse"
+        product.save()
+
+        primary, replica = self.get_product_queries(
+            reverse("product", kwargs={"product_slug": product.slug})
+        )
+        self.assertNotEqual(primary, [])
+        self.assertEqual(replica, [])
+
+    async def test_async_catalog_change_reads_from_primary(self):
+        routings = []
+
+        async def get_response(request):
+            routings.append(replica_routing.get())
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        await middleware(RequestFactory().get("/"))
+        await caches["fragments"].aset(CATALOG_CHANGED_KEY, True)
+        await middleware(RequestFactory().get("/"))
+
+        self.assertEqual([routing.use_primary for routing in routings], [False, True])
+
+    def test_request_reads_from_one_replica(self):
+        replicas = [TEST_REPLICA, "other_replica"]
+        with patch("online_shop.routers.DATABASE_REPLICAS", replicas):
+            routings = [ReplicaRouting(use_primary=False) for _ in range(20)]
+
+        for routing in routings:
+            token = replica_routing.set(routing)
+            try:
+                self.assertEqual(
+                    {Product.objects.all().db for _ in range(10)}, {routing.replica}
+                )
+            finally:
+                replica_routing.reset(token)
+        self.assertLessEqual({routing.replica for routing in routings}, set(replicas))
+
+    def test_router(self):
+        self.assertEqual(Product.objects.all().db, DEFAULT_DB_ALIAS)
+
+        token = replica_routing.set(ReplicaRouting(use_primary=False))
+        try:
+            self.assertEqual(Product.objects.all().db, TEST_REPLICA)
+            self.assertEqual(FavoriteProduct.objects.all().db, DEFAULT_DB_ALIAS)
+            self.assertEqual(Product.objects.select_for_update().db, DEFAULT_DB_ALIAS)
+            with transaction.atomic():
+                self.assertEqual(Product.objects.all().db, DEFAULT_DB_ALIAS)
+        finally:
+            replica_routing.reset(token)
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    fixtures = [
+        "fixtures/commerce_category.json",
+        "fixtures/commerce_subcategory.json",
+        "fixtures/commerce_product.json",
+        "fixtures/commerce_sizeandnumber.json",
+        "fixtures/users_user.json",
+    ]
+    query_budgets = query_budgets
+
+    @classmethod
+    def setUpTestData(cls):
+        create_synthetic_catalog(1000)
+
+    def setUp(self):
+        clear_caches()
+        self.user = get_user_model().objects.get(pk=2)
+        self.client.force_login(self.user)
+
+    def test_all_views_have_budgets(self):
+        self.assertAllViewsHaveBudgets(urlpatterns)
+
+    def test_catalog_views(self):
+        cases = [
+            ("home", None, None),
+            ("product", {"product_slug": "pidzhak"}, None),
+            ("product", {"product_slug": "remen-guess"}, None),
+            ("products_by_category", {"category_slug": "muzhchinam"}, None),
+            (
+                "products_by_category",
+                {"category_slug": "synthetic"},
+                {"sort": "price_asc"},
+            ),
+            (
+                "products_by_subcategory",
+                {"category_slug": "muzhchinam", "subcategory_slug": "obuv"},
+                None,
+            ),
+            ("search", None, None),
+            ("products_by_search", None, {"query": "кроссовки", "sort": "price_desc"}),
+            ("list_of_favorite", None, None),
+            ("message_about_wishlist", None, None),
+        ]
+        for url_name, kwargs, data in cases:
+            with self.subTest(url_name=url_name, kwargs=kwargs):
+                self.assertQueryBudget(url_name, kwargs=kwargs, data=data)
+
+    def test_autocomplete_view(self):
+        product_name_index.build()
+        self.addCleanup(product_name_index.clear)
+
+        self.assertQueryBudget("autocomplete", data={"query": "кр"})
+
+    def test_wishlist_views(self):
+        kwargs = {"product_id": 59, "user_id": self.user.pk}
+
+        self.assertQueryBudget("add_to_wishlist", kwargs=kwargs, method="post")
+        self.assertQueryBudget("remove_from_wishlist", kwargs=kwargs, method="post")
+
+        data = {"product_id": [1, 4, 59]}
+        self.assertQueryBudget("add_products_to_wishlist", data=data, method="post")
+        self.assertQueryBudget(
+            "remove_products_from_wishlist", data=data, method="post"
+        )
+
+    def test_catalog_views_do_not_scale(self):
+        cases = [
+            ("home", None, None),
+            ("product", {"product_slug": "synthetic-product-1"}, None),
+            ("products_by_category", {"category_slug": "synthetic"}, None),
+            (
+                "products_by_subcategory",
+                {"category_slug": "synthetic", "subcategory_slug": "synthetic"},
+                {"sort": "price_desc"},
+            ),
+            ("products_by_search", None, {"query": "кроссовки"}),
+            ("list_of_favorite", None, None),
+        ]
+        for url_name, kwargs, data in cases:
+            with self.subTest(url_name=url_name, kwargs=kwargs):
+                self.assertQueryCountDoesNotScale(url_name, kwargs=kwargs, data=data)
@@ -25,6 +25,11 @@ urlpatterns = [
         views.ProductsBySearchView.as_view(),
         name="products_by_search",
     ),
+    path(
+        "search/autocomplete/",
+        views.autocomplete_view,
+        name="autocomplete",
+    ),
     path(
         "wishlist/add-to-wishlist/<int:product_id>/<int:user_id>/",
         views.add_to_wishlist_view,
@@ -35,6 +40,16 @@ urlpatterns = [
         views.remove_from_wishlist_view,
         name="remove_from_wishlist",
     ),
+    path(
+        "wishlist/add-products-to-wishlist/",
+        views.AddProductsToWishlistView.as_view(),
+        name="add_products_to_wishlist",
+    ),
+    path(
+        "wishlist/remove-products-from-wishlist/",
+        views.RemoveProductsFromWishlistView.as_view(),
+        name="remove_products_from_wishlist",
+    ),
     path(
         "wishlist/message-about-wishlist/",
         views.message_about_wishlist_view,
@@ -46,3 +61,19 @@ urlpatterns = [
         name="list_of_favorite",
     ),
 ]
+
+query_budgets = {
+    "home": 7,
+    "product": 6,
+    "products_by_category": 7,
+    "products_by_subcategory": 10,
+    "search": 3,
+    "products_by_search": 6,
+    "autocomplete": 0,
+    "add_to_wishlist": 2,
+    "remove_from_wishlist": 3,
+    "add_products_to_wishlist": 3,
+    "remove_products_from_wishlist": 3,
+    "message_about_wishlist": 3,
+    "list_of_favorite": 4,
+}
@@ -1,14 +1,24 @@
+from asgiref.sync import sync_to_async
+from commerce.autocomplete import product_name_index
+from commerce.badges import ListingBadgesMixin
+from commerce.badges import ProductBadgesMixin
 from commerce.forms import SearchForm
+from commerce.mixins import CachedListingMixin
 from commerce.mixins import OrderedSearchMixin
 from commerce.mixins import WishlistLoginRequiredMixin
 from commerce.models import Product
+from commerce.services import _add_products_to_wishlist
+from commerce.services import _aget_product_with_details
 from commerce.services import _create_product_in_wishlist
 from commerce.services import _get_category_by_slug
 from commerce.services import _get_current_sort
+from commerce.services import _get_listing_cache_key
 from commerce.services import _get_newest_products
+from commerce.services import _get_product_ids_from_request
 from commerce.services import _get_products_by_category
 from commerce.services import _get_products_by_category_and_subcategory
 from commerce.services import _get_products_in_wishlist
+from commerce.services import _get_products_when_searching
 from commerce.services import _get_subcategories
 from commerce.services import _get_subcategory_by_slug
 from commerce.services import _get_title_by_category_and_subcategory
@@ -16,9 +26,11 @@ from commerce.services import _in_cart_and_not_all_sizes_in_cart
 from commerce.services import _is_favorite
 from commerce.services import _is_size
 from commerce.services import _remove_product_from_wishlist
+from commerce.services import _remove_products_from_wishlist
 from django.http import HttpRequest
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
+from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.shortcuts import render
 from django.urls import reverse
@@ -26,9 +38,12 @@ from django.urls import reverse_lazy
 from django.views.generic import DetailView
 from django.views.generic import FormView
 from django.views.generic import ListView
+from django.views.generic import View
 
+from online_shop.pagination import CursorPaginationMixin
 
-class IndexListView(ListView):
+
+class IndexListView(ProductBadgesMixin, CursorPaginationMixin, ListView):
     template_name = "commerce/list_of_products.html"
     context_object_name = "products"
     paginate_by = 6
@@ -49,29 +64,47 @@ class ProductView(DetailView):
     model = Product
     context_object_name = "product"
 
+    async def get(self, request, *args, **kwargs):
+        self.object = await _aget_product_with_details(
+            slug=self.kwargs[self.slug_url_kwarg], user=await request.auser()
+        )
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = self.object
-        user = self.request.user
 
         context["title"] = product.name
         context["is_size"] = _is_size(product=product)
-        context["is_favorite"] = _is_favorite(product=product, user=user)
+        context["is_favorite"] = _is_favorite(product=product)
         (
             context["in_cart"],
             context["not_all_sizes_in_cart"],
         ) = _in_cart_and_not_all_sizes_in_cart(
-            is_size=context["is_size"], product=product, user=user
+            is_size=context["is_size"], product=product
         )
 
         return context
 
 
-class ProductsByCategoryView(OrderedSearchMixin, ListView):
+class ProductsByCategoryView(
+    ListingBadgesMixin,
+    CachedListingMixin,
+    CursorPaginationMixin,
+    OrderedSearchMixin,
+    ListView,
+):
     template_name = "commerce/categories.html"
+    listing_template_name = "commerce/category_listing.html"
     context_object_name = "products"
     paginate_by = 6
 
+    def get_listing_cache_key(self):
+        return _get_listing_cache_key(
+            request=self.request, category_slug=self.kwargs["category_slug"]
+        )
+
     def get_queryset(self):
         products = _get_products_by_category(category_slug=self.kwargs["category_slug"])
         return super().get_ordered_queryset(products)
@@ -87,11 +120,25 @@ class ProductsByCategoryView(OrderedSearchMixin, ListView):
         return context
 
 
-class ProductsBySubcategoryView(OrderedSearchMixin, ListView):
+class ProductsBySubcategoryView(
+    ListingBadgesMixin,
+    CachedListingMixin,
+    CursorPaginationMixin,
+    OrderedSearchMixin,
+    ListView,
+):
     template_name = "commerce/subcategories.html"
+    listing_template_name = "commerce/subcategory_listing.html"
     context_object_name = "products"
     paginate_by = 6
 
+    def get_listing_cache_key(self):
+        return _get_listing_cache_key(
+            request=self.request,
+            category_slug=self.kwargs["category_slug"],
+            subcategory_slug=self.kwargs["subcategory_slug"],
+        )
+
     def get_queryset(self):
         products = _get_products_by_category_and_subcategory(
             category_slug=self.kwargs["category_slug"],
@@ -129,14 +176,16 @@ class SearchView(FormView):
         return context
 
 
-class ProductsBySearchView(OrderedSearchMixin, ListView):
+class ProductsBySearchView(
+    ProductBadgesMixin, CursorPaginationMixin, OrderedSearchMixin, ListView
+):
     template_name = "commerce/products_by_search.html"
     context_object_name = "products"
     paginate_by = 6
+    cursor_query_kwargs = ("query", "sort")
 
     def get_queryset(self):
-        query = self.request.GET.get("query")
-        products = Product.in_stock.filter(name__istartswith=query)
+        products = _get_products_when_searching(query=self.request.GET.get("query"))
         return super().get_ordered_queryset(products)
 
     def get_context_data(self, **kwargs):
@@ -147,6 +196,12 @@ class ProductsBySearchView(OrderedSearchMixin, ListView):
         return context
 
 
+async def autocomplete_view(request: HttpRequest) -> JsonResponse:
+    query = request.GET.get("query", "")
+    results = await sync_to_async(product_name_index.search)(query)
+    return JsonResponse({"results": results})
+
+
 def add_to_wishlist_view(
     request: HttpRequest, product_id: str, user_id: str
 ) -> HttpResponseRedirect:
@@ -171,6 +226,28 @@ def remove_from_wishlist_view(
     )
 
 
+class AddProductsToWishlistView(WishlistLoginRequiredMixin, View):
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        _add_products_to_wishlist(
+            product_ids=_get_product_ids_from_request(request),
+            user_id=request.user.pk,
+        )
+        return redirect(to=reverse("list_of_favorite"))
+
+
+class RemoveProductsFromWishlistView(WishlistLoginRequiredMixin, View):
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        _remove_products_from_wishlist(
+            product_ids=_get_product_ids_from_request(request),
+            user_id=request.user.pk,
+        )
+        return redirect(to=reverse("list_of_favorite"))
+
+
 def message_about_wishlist_view(request: HttpRequest) -> HttpResponse:
     return render(
         request,
@@ -179,7 +256,9 @@ def message_about_wishlist_view(request: HttpRequest) -> HttpResponse:
     )
 
 
-class FavoriteProductsView(WishlistLoginRequiredMixin, ListView):
+class FavoriteProductsView(
+    WishlistLoginRequiredMixin, ProductBadgesMixin, CursorPaginationMixin, ListView
+):
     template_name = "commerce/list_of_products.html"
     context_object_name = "products"
     paginate_by = 6
@@ -0,0 +1,70 @@
+import gc
+import multiprocessing
+import os
+
+
+def get_cpu_count() -> int:
+    try:
+        cpu_count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpu_count = multiprocessing.cpu_count()
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+        if quota != "max":
+            cpu_count = min(cpu_count, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpu_count
+
+
+def get_memory_mb() -> int:
+    memory_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**20
+    try:
+        with open("/sys/fs/cgroup/memory.max") as file:
+            limit = file.read().strip()
+        if limit != "max":
+            memory_mb = min(memory_mb, int(limit) // 2**20)
+    except (OSError, ValueError):
+        pass
+    return memory_mb
+
+
+def get_workers(cpu_count: int, memory_mb: int) -> int:
+    worker_memory_mb = int(os.getenv("GUNICORN_WORKER_MEMORY_MB", 256))
+    return max(1, min(2 * cpu_count + 1, memory_mb // worker_memory_mb))
+
+
+cpu_count = get_cpu_count()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+workers = int(os.getenv("GUNICORN_WORKERS", 0)) or get_workers(
+    cpu_count, get_memory_mb()
+)
+threads = int(os.getenv("GUNICORN_THREADS", 0)) or (
+    2 * cpu_count if worker_class == "gthread" else 1
+)
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+
+    from django.db import connections
+
+    # Соединения мастера не должны наследоваться воркерами, а объекты,
+    # созданные при загрузке приложения, не должны копироваться сборщиком мусора
+    connections.close_all()
+    gc.freeze()
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from functools import partial
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+from online_shop.settings import NAMESPACE_VERSION_KEY
+from online_shop.settings import REBUILD_LOCK_TIMEOUT
+from online_shop.settings import REBUILD_WAIT_TIMEOUT
+
+
+def get_namespace_version(namespace: str, alias: str = "default") -> int:
+    return caches[alias].get_or_set(
+        NAMESPACE_VERSION_KEY.format(namespace=namespace), time.time_ns, timeout=None
+    )
+
+
+def bump_namespace_version(namespace: str, alias: str = "default") -> None:
+    key = NAMESPACE_VERSION_KEY.format(namespace=namespace)
+    try:
+        caches[alias].incr(key)
+    except ValueError:
+        caches[alias].set(key, time.time_ns(), timeout=None)
+
+
+def make_key(namespace: str, *parts: Any, alias: str = "default") -> str:
+    version = get_namespace_version(namespace, alias)
+    return ":".join([namespace, str(version), *map(str, parts)])
+
+
+class ChangeLog:
+    def __init__(self, name: str, timeout: int, max_changes: int):
+        self.version_key = f"{name}_version"
+        self.change_key = f"{name}_change_{{version}}"
+        self.timeout = timeout
+        self.max_changes = max_changes
+
+    def register_change(self, item_id: int) -> None:
+        transaction.on_commit(partial(self.add_change, item_id))
+
+    def add_change(self, item_id: int) -> None:
+        version = self._incr_version()
+        cache.set(
+            self.change_key.format(version=version), item_id, timeout=self.timeout
+        )
+
+    def invalidate(self) -> None:
+        self._incr_version()
+
+    def _incr_version(self) -> int:
+        try:
+            return cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, 0, timeout=None)
+            return cache.incr(self.version_key)
+
+    def get_version(self) -> Optional[int]:
+        return cache.get_or_set(self.version_key, 0, timeout=None)
+
+    def get_changes(self, since: int, version: int) -> Optional[set[int]]:
+        if not 0 <= version - since <= self.max_changes:
+            return None
+
+        keys = [
+            self.change_key.format(version=v) for v in range(since + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return set(changes.values())
+
+
+def get_or_build(
+    key: str,
+    build: Callable[[], Any],
+    alias: str = "default",
+    timeout: Optional[int] = DEFAULT_TIMEOUT,
+) -> Any:
+    cache = caches[alias]
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, timeout=REBUILD_LOCK_TIMEOUT):
+        try:
+            value = build()
+            cache.set(key, value, timeout=timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + REBUILD_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return build()
+
+
+async def aget_or_build(
+    key: str,
+    build: Callable[[], Any],
+    alias: str = "default",
+    timeout: Optional[int] = DEFAULT_TIMEOUT,
+) -> Any:
+    cache = caches[alias]
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    if await cache.aadd(lock_key, 1, timeout=REBUILD_LOCK_TIMEOUT):
+        try:
+            value = await sync_to_async(build)()
+            await cache.aset(key, value, timeout=timeout)
+        finally:
+            await cache.adelete(lock_key)
+        return value
+
+    deadline = time.monotonic() + REBUILD_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+    return await sync_to_async(build)()
@@ -1,10 +1,21 @@
 from typing import Any
 
-from commerce.models import Category
+from cart.services import _get_cart_quantity
+from commerce.navigation import category_navigation
 from django.http import HttpRequest
+from django.utils.functional import SimpleLazyObject
 
 
 def category_context(request: HttpRequest) -> dict[str:Any]:
-    categories = Category.objects.all()
-    context = {"categories": categories}
+    context = {"categories": SimpleLazyObject(category_navigation.get_categories)}
+    return context
+
+
+def cart_context(request: HttpRequest) -> dict[str:Any]:
+    def get_cart_summary() -> dict[str, Any]:
+        if not request.user.is_authenticated:
+            return {}
+        return {"total_quantity": _get_cart_quantity(request.user)}
+
+    context = {"cart_summary": SimpleLazyObject(get_cart_summary)}
     return context
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from time import perf_counter
+from typing import Optional
+
+from django.conf import settings
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(
+    application: str, port: int, args: list[str], env: Optional[dict] = None
+) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            application,
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--log-level",
+            "error",
+            *args,
+        ],
+        cwd=settings.BASE_DIR,
+        env={**os.environ, **(env or {})},
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    server.wait()
+    raise TimeoutError(f"Сервер на порту {port} не запустился")
+
+
+def get_percentile(latencies: list[float], percentile: float) -> float:
+    if not latencies:
+        return 0
+    latencies = sorted(latencies)
+    return latencies[min(int(len(latencies) * percentile), len(latencies) - 1)]
+
+
+async def request(port: int, path: str) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode()
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    if b" 200 " not in status_line:
+        raise OSError(status_line.decode().strip())
+
+
+async def run_load(
+    port: int, path: str, requests: int, concurrency: int, timeout: float
+) -> tuple[float, list[float], int]:
+    remaining = requests
+    latencies = []
+    failed = 0
+
+    async def client():
+        nonlocal remaining, failed
+        while remaining > 0:
+            remaining -= 1
+            started = perf_counter()
+            try:
+                await asyncio.wait_for(request(port, path), timeout=timeout)
+                latencies.append(perf_counter() - started)
+            except (asyncio.TimeoutError, OSError):
+                failed += 1
+
+    started = perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return len(latencies) / (perf_counter() - started), latencies, failed
@@ -1,11 +1,143 @@
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from commerce.services import _get_catalog_validators
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils.cache import add_never_cache_headers
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
 
+from online_shop.routers import replica_routing
+from online_shop.routers import ReplicaRouting
+from online_shop.settings import CATALOG_CHANGED_KEY
+from online_shop.settings import DATABASE_REPLICAS
+from online_shop.settings import MICROCACHE_TIMEOUT
+from online_shop.settings import PUBLIC_CACHE_MAX_AGE
+from online_shop.settings import PUBLIC_CACHE_VIEW_NAMES
+from online_shop.settings import REPLICA_LAG_TIMEOUT
+from online_shop.settings import USE_PRIMARY_COOKIE
+
+
+class CachingPolicyMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.catalog_validators = None
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        request.catalog_validators = None
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if (
+            request.catalog_validators is None
+            or response.status_code not in (200, 304)
+            or response.cookies
+        ):
+            add_never_cache_headers(response)
+            return response
+
+        etag, last_modified = request.catalog_validators
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(int(last_modified.timestamp()))
+        patch_cache_control(response, public=True, max_age=PUBLIC_CACHE_MAX_AGE)
+        response.headers["X-Accel-Expires"] = str(MICROCACHE_TIMEOUT)
+        response.headers["X-Cache-Key"] = request.get_full_path()
+        response.headers["Surrogate-Key"] = " ".join(
+            ["catalog"]
+            + [
+                f"{name.removesuffix('_slug')}-{value}"
+                for name, value in request.resolver_match.kwargs.items()
+            ]
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method not in ("GET", "HEAD")
+            or request.resolver_match.url_name not in PUBLIC_CACHE_VIEW_NAMES
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+        ):
+            return None
+
+        request.catalog_validators = _get_catalog_validators(
+            view_kwargs.get("product_slug")
+        )
+        etag, last_modified = request.catalog_validators
+        return get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified.timestamp())
+        )
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
 
-class NoCacheMiddleware:
     def __init__(self, get_response):
+        if not DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        response = self.get_response(request)
-        add_never_cache_headers(response)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = ReplicaRouting(self.use_primary(request))
+        token = replica_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_routing.reset(token)
+        return self.process_response(response, routing)
+
+    async def __acall__(self, request):
+        routing = ReplicaRouting(await self.ause_primary(request))
+        token = replica_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_routing.reset(token)
+        return self.process_response(response, routing)
+
+    @staticmethod
+    def is_pinned_to_primary(request) -> bool:
+        return (
+            request.method not in ("GET", "HEAD", "OPTIONS")
+            or USE_PRIMARY_COOKIE in request.COOKIES
+        )
+
+    def use_primary(self, request) -> bool:
+        if self.is_pinned_to_primary(request):
+            return True
+
+        return caches["fragments"].get(CATALOG_CHANGED_KEY, False)
+
+    async def ause_primary(self, request) -> bool:
+        if self.is_pinned_to_primary(request):
+            return True
+
+        return await caches["fragments"].aget(CATALOG_CHANGED_KEY, False)
+
+    @staticmethod
+    def process_response(response, routing: ReplicaRouting):
+        if routing.wrote:
+            response.set_cookie(
+                USE_PRIMARY_COOKIE,
+                "1",
+                max_age=REPLICA_LAG_TIMEOUT,
+                httponly=True,
+                samesite="Lax",
+            )
         return response
@@ -0,0 +1,229 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from functools import reduce
+from operator import attrgetter
+from operator import or_
+from typing import Any
+from typing import Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.http import Http404
+from django.http import QueryDict
+
+CURSOR_AFTER = "a"
+CURSOR_BEFORE = "b"
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction: str, values: list[Any]) -> str:
+    data = json.dumps([direction, *values], cls=CursorEncoder)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, list[Any]]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        direction, *values = data
+    except (binascii.Error, ValueError, TypeError):
+        raise Http404("Некорректный курсор")
+    if direction not in (CURSOR_AFTER, CURSOR_BEFORE) or not values:
+        raise Http404("Некорректный курсор")
+    return direction, values
+
+
+class CursorPage:
+    def __init__(
+        self,
+        object_list: list[Any],
+        has_previous: bool,
+        has_next: bool,
+        previous_cursor: Optional[str],
+        next_cursor: Optional[str],
+    ):
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+        self.previous_query = None
+        self.next_query = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_other_pages(self) -> bool:
+        return self._has_previous or self._has_next
+
+
+class CursorPaginator:
+    is_cursor = True
+
+    def __init__(self, object_list: QuerySet | list[Any], per_page: int):
+        self.per_page = int(per_page)
+        self.ordering = self._get_ordering(object_list)
+        self.is_evaluated = (
+            not isinstance(object_list, QuerySet) or object_list.query.is_sliced
+        )
+        if self.is_evaluated:
+            self.object_list = object_list
+        else:
+            self.object_list = object_list.order_by(
+                *(
+                    f"-{name}" if descending else name
+                    for name, descending in self.ordering
+                )
+            )
+
+    def page(self, cursor: Optional[str] = None) -> CursorPage:
+        direction, values = (
+            (CURSOR_AFTER, None) if not cursor else decode_cursor(cursor)
+        )
+        if len(values or self.ordering) != len(self.ordering):
+            raise Http404("Некорректный курсор")
+
+        if self.is_evaluated:
+            objects, has_more = self._get_objects_from_list(direction, values)
+        else:
+            objects, has_more = self._get_objects_from_queryset(direction, values)
+
+        if direction == CURSOR_AFTER:
+            has_previous, has_next = values is not None, has_more
+        else:
+            has_previous, has_next = has_more, True
+
+        return CursorPage(
+            objects,
+            has_previous=has_previous and bool(objects),
+            has_next=has_next and bool(objects),
+            previous_cursor=self._get_cursor(CURSOR_BEFORE, objects[0])
+            if objects
+            else None,
+            next_cursor=self._get_cursor(CURSOR_AFTER, objects[-1])
+            if objects
+            else None,
+        )
+
+    def _get_objects_from_queryset(
+        self, direction: str, values: Optional[list[Any]]
+    ) -> tuple[list[Any], bool]:
+        reverse = direction == CURSOR_BEFORE
+        objects = self.object_list
+        if values is not None:
+            objects = objects.filter(self._get_keyset_filter(values, reverse))
+        if reverse:
+            objects = objects.reverse()
+
+        objects = list(objects[: self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[: self.per_page]
+        if reverse:
+            objects.reverse()
+        return objects, has_more
+
+    def _get_objects_from_list(
+        self, direction: str, values: Optional[list[Any]]
+    ) -> tuple[list[Any], bool]:
+        objects = list(self.object_list)
+        if values is None:
+            return objects[: self.per_page], len(objects) > self.per_page
+
+        pks = [obj.pk for obj in objects]
+        if values[-1] not in pks:
+            raise Http404("Некорректный курсор")
+        position = pks.index(values[-1])
+        if direction == CURSOR_AFTER:
+            start = position + 1
+            return (
+                objects[start : start + self.per_page],
+                len(objects) > start + self.per_page,
+            )
+        start = max(position - self.per_page, 0)
+        return objects[start:position], start > 0
+
+    def _get_keyset_filter(self, values: list[Any], reverse: bool) -> Q:
+        def lookup(name: str, descending: bool, inclusive: bool = False) -> str:
+            operator = "lt" if descending != reverse else "gt"
+            return f"{name}__{operator}{'e' if inclusive else ''}"
+
+        (first_name, first_descending), first_value = self.ordering[0], values[0]
+        conditions = []
+        for i, (name, descending) in enumerate(self.ordering):
+            equal = {
+                previous_name: value
+                for (previous_name, _), value in zip(self.ordering[:i], values)
+            }
+            conditions.append(Q(**equal, **{lookup(name, descending): values[i]}))
+
+        return Q(
+            **{lookup(first_name, first_descending, inclusive=True): first_value}
+        ) & reduce(or_, conditions)
+
+    def _get_cursor(self, direction: str, obj: Any) -> str:
+        values = [attrgetter(name.replace("__", "."))(obj) for name, _ in self.ordering]
+        return encode_cursor(direction, values)
+
+    @staticmethod
+    def _get_ordering(object_list: QuerySet | list[Any]) -> list[tuple[str, bool]]:
+        if isinstance(object_list, QuerySet):
+            query = object_list.query
+            names = list(query.order_by) or (
+                list(object_list.model._meta.ordering) if query.default_ordering else []
+            )
+        else:
+            names = list(object_list[0]._meta.ordering) if object_list else []
+
+        ordering = []
+        for name in names:
+            if not isinstance(name, str):
+                continue
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+            if name in ("pk", "id"):
+                break
+            ordering.append((name, descending))
+        tiebreaker_descending = ordering[-1][1] if ordering else False
+        return ordering + [("pk", tiebreaker_descending)]
+
+
+class CursorPaginationMixin:
+    cursor_kwarg = "cursor"
+    cursor_query_kwargs = ("sort",)
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        page.previous_query = self.get_cursor_query(page.previous_cursor)
+        page.next_query = self.get_cursor_query(page.next_cursor)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_cursor_query(self, cursor: Optional[str]) -> Optional[str]:
+        if cursor is None:
+            return None
+        query = QueryDict(mutable=True)
+        for name in self.cursor_query_kwargs:
+            if name in self.request.GET:
+                query[name] = self.request.GET[name]
+        query[self.cursor_kwarg] = cursor
+        return query.urlencode()
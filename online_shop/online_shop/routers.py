@@ -0,0 +1,48 @@
+import random
+from contextvars import ContextVar
+from typing import Optional
+
+from django.db import connections
+from django.db import DEFAULT_DB_ALIAS
+
+from online_shop.settings import DATABASE_REPLICAS
+from online_shop.settings import REPLICA_READ_MODELS
+
+
+class ReplicaRouting:
+    def __init__(self, use_primary: bool):
+        self.use_primary = use_primary
+        self.wrote = False
+        self.replica = random.choice(DATABASE_REPLICAS) if DATABASE_REPLICAS else None
+
+
+replica_routing: ContextVar[Optional[ReplicaRouting]] = ContextVar(
+    "replica_routing", default=None
+)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = replica_routing.get()
+        if (
+            routing is None
+            or routing.use_primary
+            or routing.replica is None
+            or model._meta.label_lower not in REPLICA_READ_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = replica_routing.get()
+        if routing is not None:
+            routing.use_primary = True
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
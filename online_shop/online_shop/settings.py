@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "commerce",
     "users",
     "cart",
@@ -34,7 +35,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "online_shop.middleware.NoCacheMiddleware",
+    "online_shop.middleware.CachingPolicyMiddleware",
+    "online_shop.middleware.ReplicaRoutingMiddleware",
 ]
 
 ROOT_URLCONF = "online_shop.urls"
@@ -51,6 +53,7 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "online_shop.context_processors.category_context",
+                "online_shop.context_processors.cart_context",
             ],
         },
     },
@@ -58,17 +61,46 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "online_shop.wsgi.application"
 
+PGBOUNCER = os.getenv("PGBOUNCER", "0") == "1"
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": os.getenv("POSTGRES_DB"),
         "USER": os.getenv("POSTGRES_NAME"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
-        "HOST": "db",
-        "PORT": 5432,
+        "HOST": os.getenv("POSTGRES_HOST", "pgbouncer" if PGBOUNCER else "db"),
+        "PORT": int(os.getenv("POSTGRES_PORT", 6432 if PGBOUNCER else 5432)),
+        "CONN_MAX_AGE": int(os.getenv("CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": True,
+        "DISABLE_SERVER_SIDE_CURSORS": PGBOUNCER,
     }
 }
 
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",")), start=1
+):
+    host, _, port = address.partition(":")
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": int(port or 5432),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{number}")
+
+DATABASE_ROUTERS = ["online_shop.routers.PrimaryReplicaRouter"]
+
+REPLICA_READ_MODELS = (
+    "commerce.category",
+    "commerce.subcategory",
+    "commerce.product",
+    "commerce.sizeandnumber",
+)
+REPLICA_LAG_TIMEOUT = int(os.getenv("REPLICA_LAG_TIMEOUT", 5))
+USE_PRIMARY_COOKIE = "use_primary"
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -102,6 +134,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.User"
 
+TEST_RUNNER = "online_shop.testing.FakeRedisTestRunner"
+
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.mail.ru"
 EMAIL_PORT = 2525
@@ -112,14 +146,91 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 SERVER_EMAIL = EMAIL_HOST_USER
 EMAIL_ADMIN = EMAIL_HOST_USER
 
-CASHES = {
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+REDIS_CACHE_OPTIONS = {
+    "CLIENT_CLASS": "django_redis.client.DefaultClient",
+    "CONNECTION_POOL_KWARGS": {
+        "max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", 50)),
+        "retry_on_timeout": True,
+        "health_check_interval": 30,
+    },
+    "SOCKET_CONNECT_TIMEOUT": 2,
+    "SOCKET_TIMEOUT": 2,
+}
+
+CACHE_VERSION = int(os.getenv("CACHE_VERSION", 1))
+
+CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": "redis://redis:6379/1",
-    }
+        "LOCATION": f"{REDIS_URL}/1",
+        "KEY_PREFIX": "online_shop",
+        "VERSION": CACHE_VERSION,
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": REDIS_CACHE_OPTIONS,
+    },
+    "sessions": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": f"{REDIS_URL}/2",
+        "KEY_PREFIX": "sessions",
+        "TIMEOUT": None,
+        "OPTIONS": REDIS_CACHE_OPTIONS,
+    },
+    "fragments": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": f"{REDIS_URL}/3",
+        "KEY_PREFIX": "fragments",
+        "VERSION": CACHE_VERSION,
+        "TIMEOUT": 60 * 5,
+        "OPTIONS": REDIS_CACHE_OPTIONS,
+    },
 }
 
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+SESSION_CACHE_ALIAS = "sessions"
+
+NAMESPACE_VERSION_KEY = "namespace_version_{namespace}"
+REBUILD_LOCK_TIMEOUT = 10
+REBUILD_WAIT_TIMEOUT = 2
+
 USER_CONFIRMATION_KEY = "user_confirmation_{token}"
 USER_CONFIRMATION_TIMEOUT = 300
 
-CELERY_BROKER_URL = "redis://redis:6379/0"
+CART_NAMESPACE = "cart_{user_id}"
+CART_SUMMARY_TIMEOUT = 60 * 60 * 24
+AVAILABLE_SIZES_TIMEOUT = 60
+CART_LINES_KEY = "cart_lines_{user_id}"
+CART_LINES_TIMEOUT = 60 * 60 * 24
+
+WISHLIST_KEY = "wishlist_{user_id}"
+WISHLIST_TIMEOUT = 60 * 60 * 24
+
+CATALOG_NAMESPACE = "catalog"
+CATALOG_LAST_MODIFIED_KEY = "catalog_last_modified"
+CATALOG_CHANGED_KEY = "catalog_changed"
+PRODUCT_LAST_MODIFIED_KEY = "product_last_modified_{product_slug}"
+LISTING_TIMEOUT = 60 * 60
+NEWEST_PRODUCTS_KEY = "newest_products"
+NEWEST_PRODUCTS_LIMIT = 21
+
+PUBLIC_CACHE_VIEW_NAMES = (
+    "home",
+    "product",
+    "products_by_category",
+    "products_by_subcategory",
+    "products_by_search",
+    "autocomplete",
+)
+PUBLIC_CACHE_MAX_AGE = 60
+MICROCACHE_TIMEOUT = int(os.getenv("MICROCACHE_TIMEOUT", 10))
+
+NGINX_URL = os.getenv("NGINX_URL", "http://nginx")
+NGINX_PURGE_URL = os.getenv("NGINX_PURGE_URL", "http://nginx:8081")
+CACHE_PURGE_VERSION_KEY = "cache_purge_version"
+PRODUCT_PAGE_CHANGE_TIMEOUT = 60 * 60 * 24
+PRODUCT_PAGE_MAX_CHANGES = 1000
+
+NAVIGATION_NAMESPACE = "navigation"
+
+CELERY_BROKER_URL = f"{REDIS_URL}/0"
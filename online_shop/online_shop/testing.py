@@ -0,0 +1,147 @@
+import os
+import subprocess
+import sys
+import threading
+from typing import Any
+from typing import Optional
+
+from commerce.factories import create_synthetic_catalog
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db import connections
+from django.db import DEFAULT_DB_ALIAS
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+from django.urls import reverse
+from fakeredis import TcpFakeServer
+
+TEST_REPLICA = "replica"
+
+
+class FakeRedisTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+
+        self.redis_server = TcpFakeServer(("127.0.0.1", 0))
+        self.redis_server.daemon_threads = True
+        self.redis_server.block_on_close = False
+        threading.Thread(target=self.redis_server.serve_forever, daemon=True).start()
+
+        host, port = self.redis_server.server_address
+        redis_url = f"redis://{host}:{port}"
+        os.environ["REDIS_URL"] = redis_url
+        self.cache_settings = override_settings(
+            CACHES={
+                alias: {
+                    **config,
+                    "LOCATION": config["LOCATION"].replace(
+                        settings.REDIS_URL, redis_url
+                    ),
+                }
+                for alias, config in settings.CACHES.items()
+            }
+        )
+        self.cache_settings.enable()
+
+    def setup_databases(self, **kwargs):
+        primary = connections.settings[DEFAULT_DB_ALIAS]
+        connections.settings.setdefault(
+            TEST_REPLICA,
+            {**primary, "TEST": {**primary["TEST"], "MIRROR": DEFAULT_DB_ALIAS}},
+        )
+        return super().setup_databases(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        self.redis_server.shutdown()
+        self.redis_server.server_close()
+        super().teardown_test_environment(**kwargs)
+
+
+def clear_caches() -> None:
+    for cache in caches.all():
+        cache.clear()
+
+
+def run_in_workers(code: str, number_of_workers: int = 1) -> list[str]:
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", f"import django\ndjango.setup()\n{code}"],
+            cwd=settings.BASE_DIR,
+            env=os.environ.copy(),
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(number_of_workers)
+    ]
+    return [worker.communicate(timeout=60)[0].strip() for worker in workers]
+
+
+class QueryBudgetMixin:
+    query_budgets: dict[str, int] = {}
+
+    def count_queries(
+        self,
+        url_name: str,
+        kwargs: Optional[dict[str, Any]] = None,
+        data: Optional[dict[str, Any]] = None,
+        method: str = "get",
+    ) -> int:
+        path = reverse(url_name, kwargs=kwargs)
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(path, data)
+        self.assertLess(response.status_code, 400, msg=path)
+        return len(context.captured_queries)
+
+    def get_query_budget(self, url_name: str) -> int:
+        budget_name = url_name.split(":")[-1]
+        self.assertIn(
+            budget_name,
+            self.query_budgets,
+            msg=f"Для представления {url_name} не задан бюджет запросов",
+        )
+        return self.query_budgets[budget_name]
+
+    def assertQueryBudget(
+        self,
+        url_name: str,
+        kwargs: Optional[dict[str, Any]] = None,
+        data: Optional[dict[str, Any]] = None,
+        method: str = "get",
+    ) -> int:
+        number_of_queries = self.count_queries(url_name, kwargs, data, method)
+        budget = self.get_query_budget(url_name)
+        self.assertLessEqual(
+            number_of_queries,
+            budget,
+            msg=f"{url_name}: {number_of_queries} запросов при бюджете {budget}",
+        )
+        return number_of_queries
+
+    def assertQueryCountDoesNotScale(
+        self,
+        url_name: str,
+        kwargs: Optional[dict[str, Any]] = None,
+        data: Optional[dict[str, Any]] = None,
+        number_of_products: int = 500,
+    ) -> None:
+        clear_caches()
+        before = self.count_queries(url_name, kwargs, data)
+        create_synthetic_catalog(number_of_products)
+        clear_caches()
+        after = self.count_queries(url_name, kwargs, data)
+        self.assertEqual(
+            before,
+            after,
+            msg=(
+                f"{url_name}: число запросов выросло с {before} до {after} "
+                f"после добавления {number_of_products} товаров"
+            ),
+        )
+
+    def assertAllViewsHaveBudgets(self, urlpatterns: list) -> None:
+        for pattern in urlpatterns:
+            with self.subTest(url_name=pattern.name):
+                self.assertIn(pattern.name, self.query_budgets)
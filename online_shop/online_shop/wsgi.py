@@ -13,3 +13,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "online_shop.settings")
 
 application = get_wsgi_application()
+
+from commerce.autocomplete import product_name_index  # noqa: E402
+
+product_name_index.build()
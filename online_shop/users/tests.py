@@ -4,13 +4,22 @@ from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.cache import caches
 from django.test import RequestFactory
 from django.test import TestCase
 from django.urls import reverse
 from users.forms import RegisterForm
 from users.forms import UserPasswordChangeForm
+from users.urls import query_budgets
+from users.urls import urlpatterns
 from users.views import UserPasswordChangeView
 
+from online_shop.caching import bump_namespace_version
+from online_shop.caching import make_key
+from online_shop.testing import QueryBudgetMixin
+from online_shop.testing import run_in_workers
+
 
 class LogoutTestCase(TestCase):
     fixtures = ["fixtures/users_user.json"]
@@ -298,3 +307,88 @@ class ResetPasswordTestCase(TestCase):
 
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "users/password_reset_complete.html")
+
+
+class SharedCacheTestCase(TestCase):
+    def test_confirmation_token_is_visible_to_other_workers(self):
+        user = get_user_model().objects.create(
+            email="user_n@mail.ru", password="1234", is_active=False
+        )
+        [token] = run_in_workers(
+            "from users.models import User\n"
+            "from users.services import _create_cache_entry\n"
+            f"print(_create_cache_entry(User(pk={user.pk})))"
+        )
+
+        response = self.client.get(
+            reverse("users:register_confirm", kwargs={"token": token})
+        )
+
+        self.assertRedirects(response, reverse("home"))
+        self.assertTrue(get_user_model().objects.get(pk=user.pk).is_active)
+
+    def test_cache_is_shared_between_workers(self):
+        cache.set("shared_counter", 0)
+        cache.set("shared_marker", "written by the test process")
+
+        markers = run_in_workers(
+            "from django.core.cache import cache\n"
+            "for _ in range(50):\n"
+            "    cache.incr('shared_counter')\n"
+            "print(cache.get('shared_marker'))",
+            number_of_workers=4,
+        )
+
+        self.assertEqual(markers, ["written by the test process"] * 4)
+        self.assertEqual(cache.get("shared_counter"), 200)
+
+    def test_cache_aliases_do_not_share_keys(self):
+        caches["default"].set("alias_key", "default")
+
+        self.assertIsNone(caches["fragments"].get("alias_key"))
+        self.assertIsNone(caches["sessions"].get("alias_key"))
+
+    def test_namespace_version(self):
+        key = make_key("namespace", "key")
+        cache.set(key, "value")
+
+        self.assertEqual(make_key("namespace", "key"), key)
+        bump_namespace_version("namespace")
+        self.assertNotEqual(make_key("namespace", "key"), key)
+        self.assertIsNone(cache.get(make_key("namespace", "key")))
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    fixtures = ["fixtures/users_user.json"]
+    query_budgets = query_budgets
+
+    def setUp(self):
+        self.user = get_user_model().objects.get(pk=2)
+        self.client.force_login(self.user)
+
+    def test_all_views_have_budgets(self):
+        self.assertAllViewsHaveBudgets(urlpatterns)
+
+    def test_users_views(self):
+        cases = [
+            ("users:profile", {"user_id": 2}),
+            ("users:password_change", None),
+            ("users:password_change_done", None),
+            ("users:registration", None),
+            ("users:register_confirm", {"token": uuid.uuid4().hex}),
+            ("users:email_was_sent", None),
+            ("users:password_reset", None),
+            ("users:password_reset_done", None),
+            ("users:password_reset_confirm", {"uidb64": "Mg", "token": "token"}),
+            ("users:password_reset_complete", None),
+            ("users:login", None),
+            ("users:logout", None),
+        ]
+        for url_name, kwargs in cases:
+            with self.subTest(url_name=url_name):
+                self.assertQueryBudget(url_name, kwargs=kwargs)
+
+    def test_users_views_do_not_scale(self):
+        for url_name in ("users:login", "users:registration"):
+            with self.subTest(url_name=url_name):
+                self.assertQueryCountDoesNotScale(url_name)
@@ -63,3 +63,18 @@ urlpatterns = [
         name="password_reset_complete",
     ),
 ]
+
+query_budgets = {
+    "login": 3,
+    "logout": 4,
+    "registration": 3,
+    "register_confirm": 3,
+    "email_was_sent": 3,
+    "profile": 4,
+    "password_change": 3,
+    "password_change_done": 3,
+    "password_reset": 3,
+    "password_reset_done": 3,
+    "password_reset_confirm": 4,
+    "password_reset_complete": 3,
+}